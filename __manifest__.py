@@ -6,6 +6,7 @@ __manifest__ = {
     'summary':     'Load only the Python models',
     'author':      'Abdellah Jorf',
     'depends':     ['base', 'hr', 'hr_contract', 'account'],
+    'external_dependencies': {'python': ['numpy']},
     # no data, no views, no security
     'data':        [],
     'installable': True,
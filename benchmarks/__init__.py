@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+# Outils de mesure de performance : non chargés par le module, à lancer depuis
+# un shell Odoo (voir payroll_benchmark.py). query_plans.py est aussi exécuté
+# par le test tagué ``query_plans`` (tests/test_query_plans.py).
@@ -0,0 +1,367 @@
+# -*- coding: utf-8 -*-
+"""Banc d'essai Softy Paie sur données synthétiques.
+
+À lancer depuis un shell Odoo, sur une base de test::
+
+    $ odoo-bin shell -d bench_db
+    >>> from odoo.addons.softy_paie.benchmarks import payroll_benchmark as pb  # nom du répertoire du module
+    >>> report = pb.run_benchmark(env, employees=20000, baseline='/tmp/softy_bench.json')
+
+Chaque étape mesure la durée, le débit, le nombre de requêtes SQL et le pic
+mémoire Python. Le fichier ``baseline`` sert de référence et les régressions
+sont signalées ; il n'est écrit que s'il n'existe pas encore, ou sur demande
+explicite (``update_baseline=True``) : une régression ne devient jamais la
+référence à l'insu de l'utilisateur. Les données générées sont annulées en
+fin de mesure (``rollback=True``).
+"""
+import datetime
+import gc
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from dateutil.relativedelta import relativedelta
+
+_logger = logging.getLogger(__name__)
+
+# Écart relatif toléré par rapport à la référence avant de signaler une régression.
+REGRESSION_TOLERANCE = 0.2
+
+PERIOD_START = datetime.date(2024, 1, 1)
+PERIOD_END = datetime.date(2024, 1, 31)
+
+
+class Measure:
+    """Mesure durée, requêtes SQL et pic mémoire d'un bloc de code."""
+
+    def __init__(self, env, report, step, records):
+        self.env = env
+        self.report = report
+        self.step = step
+        self.records = records
+
+    def __enter__(self):
+        gc.collect()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        self.queries = self.env.cr.sql_log_count
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # les écritures différées font partie de l'étape : durée et requêtes
+        if exc_type is None:
+            self.env.flush_all()
+        elapsed = time.perf_counter() - self.start
+        _current, peak = tracemalloc.get_traced_memory()
+        self.report[self.step] = {
+            'records': self.records,
+            'seconds': round(elapsed, 4),
+            'throughput': round(self.records / elapsed, 2) if elapsed else None,
+            'queries': self.env.cr.sql_log_count - self.queries,
+            'peak_memory_kb': peak // 1024,
+        }
+        _logger.info("bench %s: %s", self.step, self.report[self.step])
+        return False
+
+
+# -----------------------------------------------------------------------------
+# Génération des données
+# -----------------------------------------------------------------------------
+def generate_reference_data(env, tag):
+    """Tables de référence, rubriques, barème et rubriques patronales."""
+    aff_types = env['softy_pay.affiliation.type'].create([
+        {'code': '%s_%s' % (tag, code), 'name': code} for code in ('CNSS', 'AMO', 'CIMR')
+    ])
+    relationships = env['softy_pay.relationship'].create([
+        {'code': '%s_%s' % (tag, code), 'name': '%s %s' % (tag, name)}
+        for code, name in (('C', 'Conjoint'), ('E', 'Enfant'))
+    ])
+    credit = env['softy_pay.credit'].create({'code': '%s_LOG' % tag, 'name': '%s Logement' % tag})
+    absence_types = env['softy_pay.absence.type'].create([
+        {'code': '%s_%s' % (tag, code), 'name': '%s %s' % (tag, name)}
+        for code, name in (('MAL', 'Maladie'), ('CP', 'Congé payé'))
+    ])
+    bareme = env['softy_pay.bareme'].create({
+        'code': '%s_IR' % tag,
+        'name': 'IR %s' % tag,
+        'line_ids': [(0, 0, {
+            'min_value': low, 'max_value': high, 'rate': rate, 'date_start': '2020-01-01',
+        }) for low, high, rate in (
+            (0, 2500, 0), (2501, 4166, 10), (4167, 5000, 20),
+            (5001, 6666, 30), (6667, 15000, 34), (15001, 10 ** 9, 38),
+        )],
+    })
+    Rubrique = env['softy_pay.rubrique.salariale']
+    rubriques = Rubrique.create([
+        {'code': '%s_SB' % tag, 'name': 'Salaire de base', 'rubrique_type': 'indemnite',
+         'gain_or_deduction': 'gain', 'base_field': 'salary'},
+        {'code': '%s_PAN' % tag, 'name': 'Prime de panier', 'rubrique_type': 'indemnite',
+         'gain_or_deduction': 'gain', 'taxable': False, 'base_field': 'days',
+         'coefficient': 25.0},
+        {'code': '%s_HS' % tag, 'name': 'Heures sup.', 'rubrique_type': 'indemnite',
+         'gain_or_deduction': 'gain', 'base_field': 'hours', 'coefficient': 60.0},
+        {'code': '%s_PRIME' % tag, 'name': 'Prime', 'rubrique_type': 'indemnite',
+         'gain_or_deduction': 'gain', 'base_field': 'saisi', 'fixed_or_calc': 'fixed'},
+        {'code': '%s_CNSS' % tag, 'name': 'CNSS', 'rubrique_type': 'cotisation',
+         'gain_or_deduction': 'retenue', 'taxable': False, 'rate': 4.48,
+         'ceiling_amount': 268.8, 'ceiling_action': 'interdire'},
+        {'code': '%s_AMO' % tag, 'name': 'AMO', 'rubrique_type': 'cotisation',
+         'gain_or_deduction': 'retenue', 'taxable': False, 'rate': 2.26},
+        {'code': '%s_IR' % tag, 'name': 'IR', 'rubrique_type': 'cotisation',
+         'gain_or_deduction': 'retenue', 'taxable': False, 'tax_code': bareme.code},
+    ])
+    contract_type = env['hr.contract.type'].create({
+        'name': '%s CDD' % tag, 'code': '%s_CDD' % tag, 'months_before_expiry': 1,
+    })
+    categories = env['hr.employee.category'].create([
+        {'name': '%s %s' % (tag, name)} for name in ('Cadre', 'Ouvrier')
+    ])
+    env['softy_pay.rubrique.patronale'].create([
+        {'code': '%s_PCNSS' % tag, 'name': 'CNSS patronale', 'rate': 8.98},
+        {'code': '%s_PAMO' % tag, 'name': 'AMO patronale', 'rate': 4.11},
+        {'code': '%s_PCIMR' % tag, 'name': 'CIMR cadres', 'rate': 6.0,
+         'base_field': 'brut_impo', 'employee_cats': [(6, 0, categories[:1].ids)]},
+    ])
+    return {
+        'aff_types': aff_types, 'relationships': relationships, 'credit': credit,
+        'absence_types': absence_types, 'rubriques': rubriques,
+        'categories': categories, 'bareme': bareme, 'contract_type': contract_type,
+    }
+
+
+def generate_structure(env, tag, companies, departments, services):
+    """``companies`` sociétés × ``departments`` départements × ``services`` services."""
+    structure = []
+    for c in range(companies):
+        company = env['res.company'].create({
+            'name': '%s Société %d' % (tag, c), 'rc_number': '%s-RC-%d' % (tag, c),
+        })
+        for d in range(departments):
+            department = env['hr.department'].create({
+                'name': '%s Dépt %d-%d' % (tag, c, d), 'code': 'D%d' % d,
+                'company_id': company.id,
+            })
+            for s in range(services):
+                service = env['softy_pay.service'].create({
+                    'company_id': company.id, 'department_id': department.id,
+                    'code': 'S%d' % s, 'name': 'Service %d' % s,
+                })
+                structure.append((company.id, department.id, service.id))
+    return structure
+
+
+def employee_vals(structure, count, rng, tag, refs):
+    vals_list = []
+    for i in range(count):
+        company_id, department_id, service_id = structure[i % len(structure)]
+        vals_list.append({
+            'name': '%s Salarié %06d' % (tag, i),
+            'cin': '%s%06d' % (tag[:2].upper(), i),
+            'company_id': company_id,
+            'department_id': department_id,
+            'service_id': service_id,
+            'salary': round(rng.uniform(3000, 30000), 2),
+            'category_ids': [(6, 0, [rng.choice(refs['categories']).id])],
+        })
+    return vals_list
+
+
+def onboarding_rows(count, rng, tag, refs):
+    """Payload ``softy_pay.employee.onboarding`` : salariés et leurs enfants."""
+    return [{
+        'name': '%s Recrue %06d' % (tag, i),
+        'cin': '%sN%06d' % (tag[:2].upper(), i),
+        'salary': round(rng.uniform(3000, 30000), 2),
+        'affiliations': [{'type': aff_type.code, 'numero': '%s-N%d' % (aff_type.code, i),
+                          'date_start': '2024-01-01'} for aff_type in refs['aff_types']],
+        'family': [{'name': 'Membre %d' % k, 'relationship': refs['relationships'][min(k, 1)].code}
+                   for k in range(rng.randint(0, 3))],
+        'contracts': [{'reference': '%s-C%d' % (tag, i), 'contract_type': refs['contract_type'].code,
+                       'start_date': '2024-01-01', 'end_date': '2024-12-31',
+                       'duration_months': 12}],
+    } for i in range(count)]
+
+
+def generate_children(env, employees, rng, refs):
+    """Affiliations, famille, prêts, absences et appointements journaliers."""
+    aff_vals, family_vals, loan_vals, absence_vals, allowance_vals = [], [], [], [], []
+    pan_code = refs['rubriques'][1].code
+    for employee in employees:
+        for aff_type in refs['aff_types']:
+            aff_vals.append({
+                'employee_id': employee.id, 'type_id': aff_type.id,
+                'numero': '%s-%d' % (aff_type.code, employee.id),
+                'date_start': '2015-01-01',
+            })
+        for k in range(rng.randint(0, 3)):
+            family_vals.append({
+                'employee_id': employee.id, 'name': 'Membre %d' % k,
+                'relationship_id': refs['relationships'][min(k, 1)].id,
+            })
+        if rng.random() < 0.3:
+            loan_vals.append({
+                'employee_id': employee.id, 'credit_id': refs['credit'].id,
+                'file_number': 'L%d' % employee.id, 'loan_date': '2023-06-01',
+                'amount': 12000.0, 'monthly_deduction': 1000.0,
+                'first_due_date': '2023-07-31',
+            })
+        if rng.random() < 0.2:
+            start = PERIOD_START + relativedelta(days=rng.randint(0, 25))
+            absence_vals.append({
+                'employee_id': employee.id,
+                'absence_type_id': rng.choice(refs['absence_types']).id,
+                'date_start': start, 'date_end': start + relativedelta(days=rng.randint(1, 5)),
+            })
+        if rng.random() < 0.5:
+            allowance_vals.append({
+                'employee_id': employee.id, 'rule_code': pan_code,
+                'rate': rng.choice([20.0, 25.0, 30.0]), 'ceiling': 800.0,
+            })
+    env['softy_pay.employee.affiliation'].create(aff_vals)
+    env['softy_pay.employee.family'].create(family_vals)
+    env['softy_pay.employee.loan'].create(loan_vals)
+    env['softy_pay.employee.absence'].create(absence_vals)
+    env['softy_pay.daily.allowance'].create(allowance_vals)
+
+
+def write_pointage_workbook(employees, rng, refs, path):
+    """Classeur de pointage : matricule en A, codes rubriques à partir de B."""
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    codes = [rub.code for rub in refs['rubriques'][1:4]]
+    sheet.append(['Matricule'] + codes)
+    for employee in employees:
+        sheet.append([employee.matricule, rng.randint(18, 26),
+                      rng.choice([0, 0, 4, 8]), rng.choice([None, 500, 1000])])
+    workbook.save(path)
+
+
+def ensure_matricule_sequence(env):
+    if not env['ir.sequence'].search([('code', '=', 'hr.employee.matricule')], limit=1):
+        env['ir.sequence'].create({
+            'name': 'Matricule salarié', 'code': 'hr.employee.matricule',
+            'prefix': 'M', 'padding': 6,
+        })
+
+
+# -----------------------------------------------------------------------------
+# Exécution
+# -----------------------------------------------------------------------------
+def run_benchmark(env, companies=2, departments=5, services=3, employees=1000,
+                  seed=42, baseline=None, rollback=True, update_baseline=False):
+    """Génère le jeu de données et mesure les traitements de masse.
+
+    Retourne le rapport ``{'params', 'version', 'steps', 'regressions'}``,
+    comparé à ``baseline`` s'il existe. Le rapport devient la référence si
+    le fichier est absent ou si ``update_baseline`` est vrai.
+    """
+    rng = random.Random(seed)
+    tag = 'BENCH%d' % seed
+    steps = {}
+    try:
+        ensure_matricule_sequence(env)
+        refs = generate_reference_data(env, tag)
+        structure = generate_structure(env, tag, companies, departments, services)
+        vals_list = employee_vals(structure, employees, rng, tag, refs)
+
+        Employee = env['hr.employee'].with_context(
+            tracking_disable=True, mail_create_nolog=True, mail_create_nosubscribe=True)
+        with Measure(env, steps, 'employee_create', employees):
+            emps = Employee.create(vals_list)
+        generate_children(env, emps, rng, refs)
+
+        payload = onboarding_rows(employees, rng, tag, refs)
+        with Measure(env, steps, 'employee_onboard', employees):
+            env['softy_pay.employee.onboarding'].onboard(payload, structure[0][1])
+
+        with Measure(env, steps, 'constraint_checks', employees):
+            emps.with_context(set_based_checks=True)._check_dept_company()
+            emps.with_context(set_based_checks=True)._check_service_department()
+
+        template = env['softy_pay.integration.template'].create({
+            'name': '%s pointage' % tag, 'col_matricule': 1, 'col_start': 2, 'row_start': 2,
+        })
+        fd, path = tempfile.mkstemp(suffix='.xlsx')
+        os.close(fd)
+        try:
+            write_pointage_workbook(emps, rng, refs, path)
+            with open(path, 'rb') as workbook, \
+                    Measure(env, steps, 'pointage_import', employees):
+                template.import_pointage(workbook, PERIOD_START, PERIOD_END)
+        finally:
+            os.unlink(path)
+
+        with Measure(env, steps, 'dossier_load', employees):
+            env['hr.employee'].load_dossiers(emps.ids)
+
+        runs = env['softy_pay.payroll.run'].create([{
+            'name': '%s paie' % tag, 'company_id': company_id,
+            'date_from': PERIOD_START, 'date_to': PERIOD_END,
+        } for company_id in sorted({c for c, _d, _s in structure})])
+        with Measure(env, steps, 'payroll_compute', employees):
+            runs.action_compute()
+
+        corrected = emps.browse(rng.sample(emps.ids, min(30, len(emps))))
+        for employee in corrected:
+            employee.salary = round(employee.salary * 1.02, 2)
+        with Measure(env, steps, 'payroll_incremental', len(corrected)):
+            runs.action_compute_incremental()
+    finally:
+        if rollback:
+            env.cr.rollback()
+            env.registry.clear_cache()
+
+    report = {
+        'params': {
+            'companies': companies, 'departments': departments, 'services': services,
+            'employees': employees, 'seed': seed,
+        },
+        'version': _module_version(env),
+        'steps': steps,
+        'regressions': [],
+    }
+    if baseline:
+        exists = os.path.exists(baseline)
+        if exists:
+            with open(baseline) as f:
+                report['regressions'] = compare(json.load(f), report)
+            for regression in report['regressions']:
+                _logger.warning("bench regression: %s", regression)
+        if update_baseline or not exists:
+            with open(baseline, 'w') as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+            _logger.info("bench: référence enregistrée dans %s", baseline)
+    return report
+
+
+def compare(reference, report, tolerance=REGRESSION_TOLERANCE):
+    """Étapes dont le débit baisse ou le nombre de requêtes augmente de plus
+    de ``tolerance`` par rapport à ``reference``."""
+    regressions = []
+    if reference.get('params') != report['params']:
+        return ["paramètres différents de la référence : comparaison ignorée"]
+    for step, current in report['steps'].items():
+        previous = reference.get('steps', {}).get(step)
+        if not previous:
+            continue
+        if previous['throughput'] and current['throughput'] \
+                and current['throughput'] < previous['throughput'] * (1 - tolerance):
+            regressions.append("%s : débit %s → %s/s" % (
+                step, previous['throughput'], current['throughput']))
+        if current['queries'] > previous['queries'] * (1 + tolerance):
+            regressions.append("%s : requêtes %s → %s" % (
+                step, previous['queries'], current['queries']))
+    return regressions
+
+
+def _module_version(env):
+    module_name = __name__.split('.')[2] if __name__.startswith('odoo.addons.') else None
+    module = env['ir.module.module'].search([('name', '=', module_name)], limit=1)
+    return module.latest_version or None
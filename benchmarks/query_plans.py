@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""Contrôle des plans d'exécution des requêtes critiques de Softy Paie.
+
+Exécuté par le test ``query_plans`` (hors suite standard)::
+
+    $ odoo-bin -d bench_db -u softy_paie --test-tags query_plans --stop-after-init
+
+ou depuis un shell Odoo, sur une base de test::
+
+    $ odoo-bin shell -d bench_db
+    >>> from odoo.addons.softy_paie.benchmarks import query_plans as qp  # nom du répertoire du module
+    >>> qp.check_query_plans(env, employees=20000)
+
+Le jeu de données synthétique de ``payroll_benchmark`` est généré (avec des
+contrats, accidents de travail et tables du dossier salarié), les
+statistiques sont recalculées
+(``ANALYZE``) puis chaque requête est passée à ``EXPLAIN``. Un parcours
+séquentiel sur une table surveillée fait échouer le contrôle
+(``AssertionError``). Les données générées sont annulées en fin de contrôle.
+"""
+import datetime
+import logging
+import random
+
+from dateutil.relativedelta import relativedelta
+
+from . import payroll_benchmark as bench
+
+_logger = logging.getLogger(__name__)
+
+# En dessous de ce nombre de lignes, un parcours séquentiel est légitime : la
+# table est ignorée plutôt que signalée.
+MIN_PLAN_ROWS = 1000
+
+# Nombre de salariés ciblés par les requêtes « par salarié ».
+SAMPLE_SIZE = 20
+
+# Tables filles lues par salarié (chargement des dossiers, moteur de paie).
+EMPLOYEE_CHILD_TABLES = (
+    'softy_pay_employee_affiliation', 'softy_pay_daily_allowance',
+    'softy_pay_employee_additional', 'softy_pay_employee_family',
+    'softy_pay_employee_contract', 'softy_pay_employee_document',
+    'softy_pay_employee_language', 'softy_pay_employee_experience',
+    'softy_pay_employee_publication', 'softy_pay_employee_skill',
+    'softy_pay_employee_loan', 'softy_pay_employee_absence',
+    'softy_pay_employee_accident', 'softy_pay_employee_loan_schedule',
+)
+
+# (nom, table surveillée, requête) ; paramètres : ``emps``, ``from``, ``to``,
+# ``today``, ``horizon``.
+PLAN_QUERIES = [
+    ('absence_period', 'softy_pay_employee_absence', """
+        SELECT employee_id, absence_type_id, date_start, date_end
+          FROM softy_pay_employee_absence
+         WHERE employee_id = ANY(%(emps)s)
+           AND date_start <= %(to)s
+           AND date_end > %(from)s
+           AND active
+    """),
+    ('loan_schedule_due', 'softy_pay_employee_loan_schedule', """
+        SELECT employee_id, SUM(amount)
+          FROM softy_pay_employee_loan_schedule
+         WHERE employee_id = ANY(%(emps)s)
+           AND due_date >= %(from)s
+      GROUP BY employee_id
+    """),
+    ('loan_period', 'softy_pay_employee_loan', """
+        SELECT id FROM softy_pay_employee_loan
+         WHERE employee_id = ANY(%(emps)s) AND loan_date <= %(to)s
+    """),
+    ('affiliation_active', 'softy_pay_employee_affiliation', """
+        SELECT employee_id, type_id, numero
+          FROM softy_pay_employee_affiliation
+         WHERE employee_id = ANY(%(emps)s)
+           AND active
+           AND (date_start IS NULL OR date_start <= %(to)s)
+           AND (date_end IS NULL OR date_end >= %(from)s)
+    """),
+    ('contract_period', 'softy_pay_employee_contract', """
+        SELECT id FROM softy_pay_employee_contract
+         WHERE employee_id = ANY(%(emps)s)
+           AND start_date <= %(to)s AND end_date >= %(from)s
+           AND active
+    """),
+    ('contract_expiry', 'softy_pay_employee_contract', """
+        SELECT id FROM softy_pay_employee_contract
+         WHERE expiry_reminder_date IS NULL AND active
+           AND end_date >= %(today)s AND end_date <= %(horizon)s
+    """),
+    ('accident_period', 'softy_pay_employee_accident', """
+        SELECT id FROM softy_pay_employee_accident
+         WHERE employee_id = ANY(%(emps)s)
+           AND accident_date BETWEEN %(from)s AND %(to)s
+           AND active
+    """),
+] + [
+    ('%s_by_employee' % table, table,
+     "SELECT id FROM %s WHERE employee_id = ANY(%%(emps)s)" % table)
+    for table in EMPLOYEE_CHILD_TABLES
+]
+
+
+def generate_history(env, employees, rng, tag, contract_type):
+    """Contrats (échéances étalées sur cinq ans) et accidents de travail."""
+    contract_vals, accident_vals = [], []
+    for employee in employees:
+        start = datetime.date(2019, 1, 1) + relativedelta(days=rng.randint(0, 365))
+        for k in range(rng.randint(1, 3)):
+            end = start + relativedelta(months=rng.randint(6, 24), days=-1)
+            contract_vals.append({
+                'employee_id': employee.id, 'reference': '%s-%d-%d' % (tag, employee.id, k),
+                'contract_type_id': contract_type.id, 'start_date': start, 'end_date': end,
+            })
+            start = end + relativedelta(days=1)
+        if rng.random() < 0.1:
+            accident_vals.append({
+                'employee_id': employee.id, 'file_number': 'AT%d' % employee.id,
+                'accident_date': bench.PERIOD_START - relativedelta(days=rng.randint(0, 1500)),
+            })
+    env['softy_pay.employee.contract'].create(contract_vals)
+    env['softy_pay.employee.accident'].create(accident_vals)
+
+
+def generate_dossier(env, employees, rng, tag):
+    """Tables du dossier salarié non couvertes par ``payroll_benchmark`` :
+    au moins une ligne par salarié, pour que leur contrôle porte."""
+    doc_types = env['softy_pay.document.type'].create([
+        {'code': '%s_%s' % (tag, code), 'name': '%s %s' % (tag, code)} for code in ('CIN', 'DIP')
+    ])
+    languages = env['softy_pay.language'].create([
+        {'code': '%s_%s' % (tag, code), 'name': '%s %s' % (tag, code)} for code in ('AR', 'FR', 'EN')
+    ])
+    skills = env['softy_pay.skill'].create([
+        {'code': '%s_%s' % (tag, code), 'name': '%s %s' % (tag, code)} for code in ('XL', 'SQL')
+    ])
+    additional, documents, langs, exps, pubs, skill_vals = [], [], [], [], [], []
+    for employee in employees:
+        additional.append({'employee_id': employee.id, 'code': 'NB_ENF',
+                           'value_num': rng.randint(0, 4)})
+        documents.append({'employee_id': employee.id, 'type_id': rng.choice(doc_types).id,
+                          'file_name': 'doc_%d.pdf' % employee.id, 'file_data': b'JVBERg=='})
+        for language in rng.sample(list(languages), rng.randint(1, len(languages))):
+            langs.append({'employee_id': employee.id, 'language_id': language.id})
+        exps.append({'employee_id': employee.id, 'company_name': '%s Société' % tag,
+                     'start_date': datetime.date(2010, 1, 1)})
+        pubs.append({'employee_id': employee.id, 'title': '%s Publication' % tag})
+        skill_vals.append({'employee_id': employee.id, 'skill_id': rng.choice(skills).id})
+    env['softy_pay.employee.additional'].create(additional)
+    env['softy_pay.employee.document'].create(documents)
+    env['softy_pay.employee.language'].create(langs)
+    env['softy_pay.employee.experience'].create(exps)
+    env['softy_pay.employee.publication'].create(pubs)
+    env['softy_pay.employee.skill'].create(skill_vals)
+
+
+def explain(cr, query, params):
+    cr.execute("EXPLAIN (FORMAT JSON) " + query, params)
+    return cr.fetchone()[0][0]['Plan']
+
+
+def sequential_scans(plan):
+    """Tables parcourues séquentiellement dans ``plan`` (et ses sous-plans)."""
+    tables = set()
+    if plan.get('Node Type') == 'Seq Scan':
+        tables.add(plan.get('Relation Name'))
+    for child in plan.get('Plans', ()):
+        tables |= sequential_scans(child)
+    return tables
+
+
+def check_query_plans(env, companies=20, departments=2, services=2, employees=20000,
+                      seed=42, rollback=True):
+    """Génère le jeu de données et vérifie qu'aucune requête critique ne
+    parcourt séquentiellement sa table.
+
+    Retourne ``{nom: 'ok' | 'ignorée' | 'seq scan'}`` ; lève ``AssertionError``
+    si au moins une requête échoue.
+    """
+    rng = random.Random(seed)
+    tag = 'PLAN%d' % seed
+    cr = env.cr
+    results = {}
+    try:
+        bench.ensure_matricule_sequence(env)
+        refs = bench.generate_reference_data(env, tag)
+        structure = bench.generate_structure(env, tag, companies, departments, services)
+        emps = env['hr.employee'].with_context(
+            tracking_disable=True, mail_create_nolog=True, mail_create_nosubscribe=True,
+        ).create(bench.employee_vals(structure, employees, rng, tag, refs))
+        bench.generate_children(env, emps, rng, refs)
+        generate_history(env, emps, rng, tag, refs['contract_type'])
+        generate_dossier(env, emps, rng, tag)
+        env.flush_all()
+
+        tables = {table for _name, table, _query in PLAN_QUERIES}
+        for table in sorted(tables):
+            cr.execute("ANALYZE %s" % table)
+        cr.execute("""
+            SELECT relname, reltuples FROM pg_class
+             WHERE relkind = 'r' AND relname = ANY(%s)
+        """, [list(tables)])
+        row_counts = dict(cr.fetchall())
+
+        params = {
+            'emps': rng.sample(emps.ids, min(SAMPLE_SIZE, len(emps))),
+            'from': bench.PERIOD_START, 'to': bench.PERIOD_END,
+            'today': bench.PERIOD_END,
+            'horizon': bench.PERIOD_END + relativedelta(months=1),
+        }
+        for name, table, query in PLAN_QUERIES:
+            if row_counts.get(table, 0) < MIN_PLAN_ROWS:
+                results[name] = 'ignorée'
+                continue
+            scanned = sequential_scans(explain(cr, query, params))
+            results[name] = 'seq scan' if table in scanned else 'ok'
+            _logger.info("plan %s: %s", name, results[name])
+    finally:
+        if rollback:
+            cr.rollback()
+            env.registry.clear_cache()
+
+    failures = sorted(name for name, status in results.items() if status == 'seq scan')
+    if failures:
+        raise AssertionError("parcours séquentiel : %s" % ', '.join(failures))
+    return results
@@ -1,7 +1,15 @@
+from . import code_cache
+from . import payroll_tracking
+from . import history
 from . import company
 from . import employee
 from . import common_models
 from . import employee_related
 from . import regulatory_models
 from . import affiliation_type
-from . import affiliation
\ No newline at end of file
+from . import affiliation
+from . import pointage
+from . import payroll_engine
+from . import payroll_run
+from . import payroll_queue
+from . import onboarding
@@ -1,15 +1,30 @@
 # -*- coding: utf-8 -*-
-from odoo import models, fields
+# pyright: reportAttributeAccessIssue=false, reportArgumentType=false
+from odoo import api, models, fields, _
+from odoo.exceptions import ValidationError
+from odoo.tools import create_index
+from odoo.tools.sql import constraint_definition, drop_constraint
+
+from .sql_tools import fetch_violations
+
+# Clé du cache de affiliations_at dans le cache du curseur.
+AFFILIATIONS_AT_CACHE = 'softy_pay.affiliations_at'
 
 class SoftyPayEmployeeAffiliation(models.Model):
+    """Affiliation datée : un salarié peut avoir plusieurs affiliations d'un
+    même type (changement de numéro, radiation puis réaffiliation) tant que
+    leurs périodes ne se chevauchent pas. Une date vide est ouverte."""
     _name = "softy_pay.employee.affiliation"
+    _inherit = 'softy_pay.payroll.input.mixin'
     _description = "Affiliation salarié"
+    _order = 'employee_id, type_id, date_start desc'
 
     employee_id  = fields.Many2one(
-        'hr.employee', 
-        string="Salarié", 
-        required=True, 
-        ondelete='cascade')
+        'hr.employee',
+        string="Salarié",
+        required=True,
+        ondelete='cascade',
+        index=True)
     type_id      = fields.Many2one(
         'softy_pay.affiliation.type',
         string="Type d'affiliation",
@@ -19,8 +34,101 @@ class SoftyPayEmployeeAffiliation(models.Model):
     date_end     = fields.Date("Date de fin")
     active       = fields.Boolean("Actif", default=True)
 
-    _sql_constraints = [
-        ('employee_type_unique',
-         'unique(employee_id, type_id)',
-         "Ce salarié a déjà une affiliation de ce type."),
-    ]
+    def init(self):
+        # L'unicité (salarié, type) interdisait l'historique : remplacée par
+        # la contrainte de non-chevauchement des périodes.
+        if constraint_definition(self.env.cr, self._table, '%s_employee_type_unique' % self._table):
+            drop_constraint(self.env.cr, self._table, '%s_employee_type_unique' % self._table)
+        # Déclarations : affiliations actives d'un type sur une période.
+        create_index(self.env.cr, 'softy_pay_employee_affiliation_active_type_idx',
+                     self._table, ['type_id', 'employee_id'], where='active')
+        create_index(self.env.cr, 'softy_pay_employee_affiliation_period_idx',
+                     self._table, ['employee_id', 'date_start', 'date_end'],
+                     where='active')
+
+    @api.constrains('employee_id', 'type_id', 'date_start', 'date_end', 'active')
+    def _check_periods(self):
+        invalid = fetch_violations(self, """
+            SELECT a.id
+              FROM softy_pay_employee_affiliation a
+             WHERE a.id = ANY(%s) AND a.active
+               AND (a.date_end < a.date_start OR EXISTS (
+                    SELECT 1 FROM softy_pay_employee_affiliation b
+                     WHERE b.employee_id = a.employee_id AND b.type_id = a.type_id
+                       AND b.id <> a.id AND b.active
+                       AND (a.date_start IS NULL OR b.date_end IS NULL
+                            OR b.date_end >= a.date_start)
+                       AND (b.date_start IS NULL OR a.date_end IS NULL
+                            OR a.date_end >= b.date_start)))
+        """)
+        if invalid:
+            raise ValidationError(
+                _("Les périodes d'affiliation d'un même type ne doivent pas se "
+                  "chevaucher (ni finir avant de commencer).") + "\n" + "\n".join(
+                    "- %s : %s %s (%s → %s)" % (
+                        aff.employee_id.display_name, aff.type_id.code, aff.numero,
+                        aff.date_start or '…', aff.date_end or '…')
+                    for aff in invalid))
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        self._invalidate_affiliations_at()
+        return records
+
+    def write(self, vals):
+        res = super().write(vals)
+        self._invalidate_affiliations_at()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self._invalidate_affiliations_at()
+        return res
+
+    @api.model
+    def affiliations_at(self, employee_ids, date):
+        """Affiliations en vigueur au ``date`` d'un lot de salariés.
+
+        Retourne ``{employee_id: {code type: numéro}}`` ; les salariés sans
+        affiliation à cette date sont absents. Les salariés pas encore lus
+        pour cette date le sont en une requête sur l'index de période ; le
+        résultat est conservé pour la transaction (par date), de sorte que
+        déclarations et rappels d'une même période ne relisent pas la table.
+        """
+        date = fields.Date.to_date(date)
+        loaded, index = self._affiliations_at_cache().setdefault(date, (set(), {}))
+        missing = [emp_id for emp_id in set(employee_ids) if emp_id not in loaded]
+        if missing:
+            self.flush_model()
+            self.env['softy_pay.affiliation.type'].flush_model(['code'])
+            self.env.cr.execute("""
+                SELECT a.employee_id, t.code, a.numero
+                  FROM softy_pay_employee_affiliation a
+                  JOIN softy_pay_affiliation_type t ON t.id = a.type_id
+                 WHERE a.employee_id = ANY(%(emps)s)
+                   AND a.active
+                   AND (a.date_start IS NULL OR a.date_start <= %(date)s)
+                   AND (a.date_end IS NULL OR a.date_end >= %(date)s)
+            """, {'emps': missing, 'date': date})
+            for employee_id, code, numero in self.env.cr.fetchall():
+                index.setdefault(employee_id, {})[code] = numero
+            loaded.update(missing)
+        return {emp_id: dict(index[emp_id]) for emp_id in employee_ids if emp_id in index}
+
+    @api.model
+    def _affiliations_at_cache(self):
+        """``{date: (ids lus, {employee_id: {code: numéro}})}`` propre à la
+        transaction : vidé à la validation ou à l'annulation, et à chaque
+        modification d'affiliation."""
+        cr = self.env.cr
+        cache = cr.cache.get(AFFILIATIONS_AT_CACHE)
+        if cache is None:
+            cache = cr.cache[AFFILIATIONS_AT_CACHE] = {}
+            cr.postcommit.add(self._invalidate_affiliations_at)
+            cr.postrollback.add(self._invalidate_affiliations_at)
+        return cache
+
+    @api.model
+    def _invalidate_affiliations_at(self):
+        self.env.cr.cache.pop(AFFILIATIONS_AT_CACHE, None)
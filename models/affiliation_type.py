@@ -1,8 +1,11 @@
 # -*- coding: utf-8 -*-
 from odoo import fields, models
 
+from .transfer_file import FixedWidthFile, ascii_field, cents, csv_line, deliver_file
+
 class SoftyPayAffiliationType(models.Model):
     _name = "softy_pay.affiliation.type"
+    _inherit = 'softy_pay.code.mixin'
     _description = "Type d'affiliation salarié"
 
     code = fields.Char("Code", required=True)
@@ -11,3 +14,94 @@ class SoftyPayAffiliationType(models.Model):
     _sql_constraints = [
         ('code_unique', 'unique(code)', "Le code doit être unique."),
     ]
+
+    def write(self, vals):
+        res = super().write(vals)
+        if 'code' in vals:
+            # affiliations_at est indexé par code de type
+            self.env['softy_pay.employee.affiliation']._invalidate_affiliations_at()
+        return res
+
+    def export_declaration(self, run, file_format='fixed', directory=None):
+        """Génère un fichier de déclaration par type d'affiliation de ``self``.
+
+        Une seule requête, lue par curseur serveur, joint affiliations actives
+        sur la période, salariés et lignes de paie de la campagne ; chaque
+        ligne est écrite aussitôt et les totaux sont cumulés au fil de l'eau.
+        ``file_format`` : ``'fixed'`` (largeur fixe) ou ``'csv'``.
+        Retourne la liste des fichiers générés avec leurs totaux.
+        """
+        self.env['softy_pay.employee.affiliation'].flush_model()
+        self.env['softy_pay.payroll.run.line'].flush_model()
+        self.env['hr.employee'].flush_model()
+        # Numéro changé en cours de période : l'affiliation la plus récente
+        # est déclarée, une seule fois par salarié et par type.
+        query = """
+            SELECT t.code, a.numero, e.matricule, e.name, e.cin, COALESCE(l.gross, 0.0)
+              FROM (SELECT DISTINCT ON (type_id, employee_id) type_id, employee_id, numero
+                      FROM softy_pay_employee_affiliation
+                     WHERE type_id = ANY(%(types)s)
+                       AND active
+                       AND (date_start IS NULL OR date_start <= %(to)s)
+                       AND (date_end IS NULL OR date_end >= %(from)s)
+                  ORDER BY type_id, employee_id, date_start DESC NULLS LAST, id DESC) a
+              JOIN softy_pay_affiliation_type t ON t.id = a.type_id
+              JOIN hr_employee e ON e.id = a.employee_id
+         LEFT JOIN (SELECT employee_id, SUM(amount) AS gross
+                      FROM softy_pay_payroll_run_line
+                     WHERE run_id = %(run)s AND line_type = 'gain'
+                  GROUP BY employee_id) l ON l.employee_id = e.id
+             WHERE e.company_id = %(company)s
+          ORDER BY t.code, e.matricule
+        """
+        params = {
+            'run': run.id, 'types': self.ids, 'company': run.company_id.id,
+            'from': run.date_from, 'to': run.date_to,
+        }
+        extension = 'csv' if file_format == 'csv' else 'txt'
+        files = []
+        current = None
+        with self.env.cr._cnx.cursor('softy_pay_declaration') as server_cursor:
+            server_cursor.itersize = 2000
+            server_cursor.execute(query, params)
+            for code, numero, matricule, name, cin, gross in server_cursor:
+                if current and current.key != code:
+                    files.append(self._close_declaration(current, run, extension, directory))
+                    current = None
+                if current is None:
+                    current = FixedWidthFile(code)
+                    current.write(self._declaration_header(run, code, file_format),
+                                  counted=False)
+                if file_format == 'csv':
+                    line = csv_line([numero, matricule, name, cin, '%.2f' % gross])
+                else:
+                    line = ''.join([
+                        'D', ascii_field(numero, 20), ascii_field(matricule, 12),
+                        ascii_field(name, 35), ascii_field(cin, 12), cents(gross, 15),
+                    ])
+                current.write(line, gross)
+        if current:
+            files.append(self._close_declaration(current, run, extension, directory))
+        return files
+
+    def _declaration_header(self, run, code, file_format):
+        if file_format == 'csv':
+            return csv_line(['numero', 'matricule', 'nom', 'cin', 'salaire'])
+        return ''.join([
+            'H', ascii_field(run.company_id.social_sec_ref, 20), ascii_field(code, 10),
+            run.date_to.strftime('%Y%m'),
+        ])
+
+    def _close_declaration(self, declaration, run, extension, directory):
+        if extension == 'csv':
+            declaration.write(csv_line(['TOTAL', declaration.count, '', '',
+                                        '%.2f' % declaration.total]), counted=False)
+        else:
+            declaration.write(''.join([
+                'T', ascii_field(declaration.count, 8, align='right', fill='0'),
+                cents(declaration.total, 18),
+            ]), counted=False)
+        declaration.close()
+        name = 'DECL_%s_%s.%s' % (
+            ascii_field(declaration.key, 10).strip(), run.date_to.strftime('%Y%m'), extension)
+        return deliver_file(self.env, declaration, name, run, directory)
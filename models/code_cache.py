@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+# pyright: reportAttributeAccessIssue=false, reportArgumentType=false
+from odoo import api, models, tools
+
+# Tables de référence dont la correspondance code → id est mise en cache.
+CODE_CACHED_MODELS = (
+    'softy_pay.relationship',
+    'softy_pay.document.type',
+    'softy_pay.language',
+    'softy_pay.skill',
+    'softy_pay.credit',
+    'softy_pay.absence.type',
+    'softy_pay.affiliation.type',
+    'hr.contract.type',
+)
+
+
+class SoftyPayCodeMixin(models.AbstractModel):
+    _name = 'softy_pay.code.mixin'
+    _description = "Table de référence résolue par code"
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        self.env.registry.clear_cache()
+        return records
+
+    def write(self, vals):
+        res = super().write(vals)
+        if 'code' in vals:
+            self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env.registry.clear_cache()
+        return res
+
+
+class SoftyPayCodeCache(models.AbstractModel):
+    _name = 'softy_pay.code.cache'
+    _description = "Cache code → id des tables de référence"
+
+    @api.model
+    def resolve_codes(self, model, codes):
+        """Résout un lot de codes de ``model`` en ids.
+
+        Retourne ``{code: id}`` pour les codes connus ; les codes inconnus
+        sont simplement absents. La table complète est chargée une fois par
+        registre puis servie depuis le cache, invalidé (pour tous les
+        workers) à chaque création, modification de code ou suppression.
+        """
+        mapping = self._get_code_map(model)
+        return {code: mapping[code] for code in codes if code in mapping}
+
+    @api.model
+    @tools.ormcache('model')
+    def _get_code_map(self, model):
+        if model not in CODE_CACHED_MODELS:
+            raise ValueError("Modèle sans cache de codes : %s" % model)
+        records = self.env[model].sudo().with_context(active_test=False).search_read(
+            [('code', '!=', False)], ['code'])
+        return tools.frozendict((rec['code'], rec['id']) for rec in records)
@@ -33,7 +33,7 @@ class SoftyPayEmployeeProfile(models.Model):
 
 
 class HrContractType(models.Model):
-    _inherit = 'hr.contract.type'
+    _inherit = ['hr.contract.type', 'softy_pay.code.mixin']
     _description = "Type de Contrat étendu Softy Paie"
 
     code                  = fields.Char("Code Contrat", required=True)
@@ -55,6 +55,7 @@ class HrContractType(models.Model):
 
 class SoftyPayRelationship(models.Model):
     _name = 'softy_pay.relationship'
+    _inherit = 'softy_pay.code.mixin'
     _description = "Type de Lien de Parentalité (Table Réf.)"
 
     code = fields.Char("Code Lien", required=True)
@@ -72,6 +73,7 @@ class SoftyPayRelationship(models.Model):
 
 class SoftyPayDocumentType(models.Model):
     _name = 'softy_pay.document.type'
+    _inherit = 'softy_pay.code.mixin'
     _description = "Type de Document (Table Réf.)"
 
     code = fields.Char("Code Type", required=True)
@@ -89,6 +91,7 @@ class SoftyPayDocumentType(models.Model):
 
 class SoftyPayLanguage(models.Model):
     _name = 'softy_pay.language'
+    _inherit = 'softy_pay.code.mixin'
     _description = "Langue (Table Réf.)"
 
     code = fields.Char("Code Langue", required=True)
@@ -106,6 +109,7 @@ class SoftyPayLanguage(models.Model):
 
 class SoftyPaySkill(models.Model):
     _name = 'softy_pay.skill'
+    _inherit = 'softy_pay.code.mixin'
     _description = "Compétence (Table Réf.)"
 
     code = fields.Char("Code Compétence", required=True)
@@ -123,6 +127,7 @@ class SoftyPaySkill(models.Model):
 
 class SoftyPayCredit(models.Model):
     _name = 'softy_pay.credit'
+    _inherit = 'softy_pay.code.mixin'
     _description = "Crédit / Prêt (Table Réf.)"
 
     code = fields.Char("Code Crédit", required=True)
@@ -140,6 +145,7 @@ class SoftyPayCredit(models.Model):
 
 class SoftyPayAbsenceType(models.Model):
     _name = 'softy_pay.absence.type'
+    _inherit = 'softy_pay.code.mixin'
     _description = "Type d'Absence (Table Réf.)"
 
     code = fields.Char("Code Absence", required=True)
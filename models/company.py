@@ -3,6 +3,8 @@
 from odoo import api, fields, models, _
 from odoo.exceptions import ValidationError
 
+from .sql_tools import fetch_violations, use_set_based_checks
+
 
 class RetirementFund(models.Model):
     _name = 'softy_pay.retirement.fund'
@@ -102,6 +104,22 @@ class SoftyService(models.Model):
 
     @api.constrains('company_id', 'department_id')
     def _check_dept_company(self):
+        if use_set_based_checks(self):
+            invalid = fetch_violations(self, """
+                SELECT s.id
+                  FROM softy_pay_service s
+                  JOIN hr_department d ON d.id = s.department_id
+                 WHERE s.id = ANY(%s)
+                   AND d.company_id IS DISTINCT FROM s.company_id
+            """)
+            if invalid:
+                raise ValidationError(
+                    _("Le département doit appartenir à la même société "
+                      "que le service.")
+                    + "\n" + "\n".join(
+                        "- [%s] %s" % (rec.id, rec.display_name) for rec in invalid)
+                )
+            return
         for rec in self:
             if rec.department_id.company_id != rec.company_id:
                 raise ValidationError(
@@ -1,12 +1,37 @@
 # -*- coding: utf-8 -*-
 # pyright: reportAttributeAccessIssue=false, reportArgumentType=false
+import datetime
+
 from odoo import api, fields, models, _
 from odoo.exceptions import ValidationError
+from odoo.tools import create_index, escape_psql
+
+from .sql_tools import fetch_violations, use_set_based_checks
+
+MATRICULE_SEQUENCE = 'hr.employee.matricule'
+
+# Collections du dossier salarié, chargeables par load_dossiers().
+DOSSIER_SECTIONS = (
+    'affiliation_ids', 'daily_allowance_ids', 'additional_info_ids',
+    'dependent_ids', 'contract_ids', 'document_ids', 'language_ids',
+    'experience_ids', 'publication_ids', 'skill_ids', 'loan_ids',
+    'absence_ids', 'accident_ids',
+)
+
+
+def _serializable(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return value.decode('ascii')
+    return value
 
 
 class HrEmployee(models.Model):
-    _inherit = 'hr.employee'
+    _inherit = ['hr.employee', 'softy_pay.payroll.input.mixin']
     _description = 'Salarié Softy Paie'
+    _rec_names_search = ['name', 'matricule', 'cin']
+    _payroll_input_fields = frozenset(['salary', 'company_id', 'category_ids', 'active'])
 
     # -------------------------------------------------------------------------
     # Identifiants uniques
@@ -14,9 +39,10 @@ class HrEmployee(models.Model):
     matricule = fields.Char(
         string='Matricule',
         readonly=True,
-        default=lambda self: self.env['ir.sequence'].next_by_code('hr.employee.matricule'),
+        copy=False,
+        index='trigram',
     )
-    cin = fields.Char(string='CIN', required=True)
+    cin = fields.Char(string='CIN', required=True, index='trigram')
 
     _sql_constraints = [
         ('matricule_unique',
@@ -27,7 +53,7 @@ class HrEmployee(models.Model):
     # -------------------------------------------------------------------------
     # Informations personnelles
     # -------------------------------------------------------------------------
-    name         = fields.Char('Nom Complet', required=True)
+    name         = fields.Char('Nom Complet', required=True, index='trigram')
     birth_date   = fields.Date('Date de Naissance')
     gender       = fields.Selection(
         [('male', 'Masculin'), ('female', 'Féminin')],
@@ -179,6 +205,189 @@ class HrEmployee(models.Model):
         string='Accidents',
     )
 
+    def init(self):
+        # Les index trigrammes (recherche partielle) ne servent pas l'égalité :
+        # la CIN exacte garde un index B-tree (le matricule a son index unique).
+        create_index(self.env.cr, 'hr_employee_cin_idx', self._table, ['cin'])
+
+    # -------------------------------------------------------------------------
+    # Recherche approchée
+    # -------------------------------------------------------------------------
+    @api.model
+    def search_employees(self, term, limit=20, offset=0):
+        """Recherche de salariés par nom, CIN ou matricule partiels.
+
+        Une seule requête paginée : les CIN et matricules exacts viennent en
+        tête, puis les correspondances (sous-chaîne ou, avec pg_trgm,
+        similarité trigramme) par similarité décroissante.
+        Retourne ``[{'id', 'name', 'matricule', 'cin', 'score'}]``.
+        """
+        term = (term or '').strip()
+        if not term:
+            return []
+        self.flush_model(['name', 'cin', 'matricule', 'company_id', 'active'])
+        if self.env.registry.has_trigram:
+            similarity = """GREATEST(similarity(name, %(term)s),
+                                     similarity(COALESCE(cin, ''), %(term)s),
+                                     similarity(COALESCE(matricule, ''), %(term)s))"""
+            fuzzy = "OR name %% %(term)s"
+        else:
+            similarity, fuzzy = "0.0", ""
+        self.env.cr.execute("""
+            SELECT id, CASE WHEN exact THEN 1.0 ELSE score END
+              FROM (SELECT id, name,
+                           (cin = %(term)s OR matricule = %(term)s) AS exact,
+                           """ + similarity + """ AS score
+                      FROM hr_employee
+                     WHERE (cin = %(term)s OR matricule = %(term)s
+                            OR name ILIKE %(like)s OR cin ILIKE %(like)s
+                            OR matricule ILIKE %(like)s """ + fuzzy + """)
+                       AND active
+                       AND (company_id IS NULL OR company_id = ANY(%(companies)s))
+                   ) AS hits
+          ORDER BY exact DESC, score DESC, name, id
+             LIMIT %(limit)s OFFSET %(offset)s
+        """, {
+            'term': term,
+            'like': '%%%s%%' % escape_psql(term),
+            'companies': self.env.companies.ids,
+            'limit': limit,
+            'offset': offset,
+        })
+        rows = self.env.cr.fetchall()
+
+        scores = dict(rows)
+        employees = self.browse(scores)._filter_access_rules('read')
+        by_id = {vals['id']: vals for vals in employees.read(['name', 'matricule', 'cin'])}
+        return [
+            dict(by_id[emp_id], score=float(score))
+            for emp_id, score in rows if emp_id in by_id
+        ]
+
+    @api.model
+    def match_by_cin(self, cins):
+        """Correspondance CIN → salarié pour les imports sans matricule.
+
+        Une seule requête indexée ; une CIN portée par plusieurs salariés est
+        ambiguë et n'est pas résolue.
+        """
+        cins = list({cin.strip() for cin in cins if cin and cin.strip()})
+        if not cins:
+            return {}
+        self.flush_model(['cin', 'active'])
+        self.env.cr.execute("""
+            SELECT cin, MIN(id)
+              FROM hr_employee
+             WHERE cin = ANY(%s) AND active
+          GROUP BY cin
+            HAVING COUNT(*) = 1
+        """, [cins])
+        return dict(self.env.cr.fetchall())
+
+    # -------------------------------------------------------------------------
+    # Attribution des matricules
+    # -------------------------------------------------------------------------
+    @api.model_create_multi
+    def create(self, vals_list):
+        # copies : si la création est annulée (savepoint), les valeurs de
+        # l'appelant ne doivent pas garder des matricules dont la réservation
+        # a été annulée avec elle
+        vals_list = [dict(vals) for vals in vals_list]
+        missing = [vals for vals in vals_list if not vals.get('matricule')]
+        if missing:
+            for vals, matricule in zip(missing, self.reserve_matricules(len(missing))):
+                vals['matricule'] = matricule
+        return super().create(vals_list)
+
+    def write(self, vals):
+        res = super().write(vals)
+        self.env['softy_pay.pointage.grid.change'].log_employee_fields(self.ids, vals)
+        return res
+
+    @api.model
+    def reserve_matricules(self, count):
+        """Réserve ``count`` matricules de la séquence ``hr.employee.matricule``.
+
+        Le bloc est réservé en une seule instruction SQL au lieu d'un appel
+        ``next_by_code`` par salarié :
+
+        - séquence *sans trou* : la ligne ``ir_sequence`` est verrouillée une
+          seule fois et le bloc réservé est contigu ;
+        - séquence *standard* : ``nextval`` sur ``generate_series`` ; les
+          numéros sont uniques mais peuvent s'intercaler avec ceux d'une
+          transaction concurrente.
+
+        Les séquences à plages de dates retombent sur l'attribution unitaire.
+        """
+        if count <= 0:
+            return []
+        sequence = self.env['ir.sequence'].sudo().search([
+            ('code', '=', MATRICULE_SEQUENCE),
+            ('company_id', 'in', [self.env.company.id, False]),
+        ], order='company_id', limit=1)
+        if not sequence:
+            return [False] * count
+        if sequence.use_date_range:
+            return [sequence.next_by_id() for _i in range(count)]
+
+        cr = self.env.cr
+        if sequence.implementation == 'standard':
+            cr.execute(
+                "SELECT nextval(%s) FROM generate_series(1, %s)",
+                ['ir_sequence_%03d' % sequence.id, count])
+            numbers = [row[0] for row in cr.fetchall()]
+        else:
+            cr.execute("""
+                UPDATE ir_sequence
+                   SET number_next = number_next + %s * number_increment
+                 WHERE id = %s
+             RETURNING number_next, number_increment
+            """, [count, sequence.id])
+            number_next, step = cr.fetchone()
+            first = number_next - count * step
+            numbers = [first + k * step for k in range(count)]
+            sequence.invalidate_recordset(['number_next'])
+        return [sequence.get_next_char(number) for number in numbers]
+
+    # -------------------------------------------------------------------------
+    # Chargement groupé des dossiers
+    # -------------------------------------------------------------------------
+    @api.model
+    def load_dossiers(self, employee_ids, sections=None, include_binary=False):
+        """Charge les collections du dossier de plusieurs salariés.
+
+        Une requête par modèle enfant demandé, quel que soit le nombre de
+        salariés. Les champs binaires (``file_data``, ``certificate_file``)
+        ne sont lus que si ``include_binary`` est vrai. Les Many2one sont
+        rendus en ids et les dates en chaînes ISO, pour une structure
+        directement sérialisable :
+        ``{employee_id: {section: [{champ: valeur}, ...]}}``.
+        """
+        sections = list(sections or DOSSIER_SECTIONS)
+        unknown = set(sections) - set(DOSSIER_SECTIONS)
+        if unknown:
+            raise ValueError("Sections de dossier inconnues : %s" % ", ".join(sorted(unknown)))
+        employee_ids = list(employee_ids)
+        dossiers = {emp_id: {section: [] for section in sections} for emp_id in employee_ids}
+        for section in sections:
+            field = self._fields[section]
+            Child = self.env[field.comodel_name]
+            inverse = field.inverse_name
+            fnames = [
+                name for name, child_field in Child._fields.items()
+                if child_field.store
+                and name not in models.LOG_ACCESS_COLUMNS
+                and (include_binary or child_field.type != 'binary')
+            ]
+            rows = Child.search_read(
+                [(inverse, 'in', employee_ids)], fnames, order='id', load=None)
+            for row in rows:
+                emp_id = row.pop(inverse)
+                dossiers[emp_id][section].append({
+                    name: _serializable(value) for name, value in row.items()
+                })
+        return dossiers
+
     # -------------------------------------------------------------------------
     # Onchange & contraintes
     # -------------------------------------------------------------------------
@@ -204,6 +413,20 @@ class HrEmployee(models.Model):
 
     @api.constrains('department_id', 'company_id')
     def _check_dept_company(self):
+        if use_set_based_checks(self):
+            invalid = fetch_violations(self, """
+                SELECT e.id
+                  FROM hr_employee e
+                  JOIN hr_department d ON d.id = e.department_id
+                 WHERE e.id = ANY(%s)
+                   AND d.company_id IS DISTINCT FROM e.company_id
+            """)
+            if invalid:
+                raise ValidationError(
+                    _("Le département doit appartenir à la même société.")
+                    + "\n" + invalid._format_violations()
+                )
+            return
         for rec in self.filtered('department_id'):
             if rec.department_id.company_id != rec.company_id:
                 raise ValidationError(
@@ -212,8 +435,56 @@ class HrEmployee(models.Model):
 
     @api.constrains('service_id', 'department_id')
     def _check_service_department(self):
+        if use_set_based_checks(self):
+            invalid = fetch_violations(self, """
+                SELECT e.id
+                  FROM hr_employee e
+                  JOIN softy_pay_service s ON s.id = e.service_id
+                 WHERE e.id = ANY(%s)
+                   AND s.department_id IS DISTINCT FROM e.department_id
+            """)
+            if invalid:
+                raise ValidationError(
+                    _("Le service doit appartenir au même département.")
+                    + "\n" + invalid._format_violations()
+                )
+            return
         for rec in self.filtered('service_id'):
             if rec.service_id.department_id != rec.department_id:
                 raise ValidationError(
                     _("Le service doit appartenir au même département.")
                 )
+
+    def _get_payroll_employee_ids(self):
+        return self.ids
+
+    def _format_violations(self):
+        return "\n".join(
+            "- [%s] %s (%s)" % (rec.id, rec.name, rec.matricule or '')
+            for rec in self)
+
+
+class HrEmployeeCategory(models.Model):
+    _inherit = 'hr.employee.category'
+
+    # Les membres modifiés côté catégorie (employee_ids) ne passent pas par
+    # hr.employee.write : anciens et nouveaux membres sont marqués à
+    # recalculer.
+    @api.model_create_multi
+    def create(self, vals_list):
+        categories = super().create(vals_list)
+        if any(vals.get('employee_ids') for vals in vals_list):
+            self.env['softy_pay.payroll.change'].mark(categories.employee_ids.ids)
+        return categories
+
+    def write(self, vals):
+        if 'employee_ids' not in vals:
+            return super().write(vals)
+        members = self.employee_ids
+        res = super().write(vals)
+        self.env['softy_pay.payroll.change'].mark((members | self.employee_ids).ids)
+        return res
+
+    def unlink(self):
+        self.env['softy_pay.payroll.change'].mark(self.employee_ids.ids)
+        return super().unlink()
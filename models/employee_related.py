@@ -1,11 +1,33 @@
 # -*- coding: utf-8 -*-
 # pyright: reportAttributeAccessIssue=false, reportArgumentType=false
+import logging
+
+from dateutil.relativedelta import relativedelta
+
 from odoo import api, fields, models, _
-from odoo.exceptions import ValidationError
+from odoo.exceptions import UserError, ValidationError
+from odoo.tools import create_index, float_round
+
+from .sql_tools import bulk_insert
+
+_logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+except ImportError:
+    _logger.debug("numpy introuvable : le décompte des absences est indisponible.")
+    np = None
+
+# Champs dont la modification régénère l'échéancier d'un prêt.
+LOAN_SCHEDULE_FIELDS = {
+    'employee_id', 'loan_date', 'amount', 'monthly_deduction',
+    'first_due_date', 'last_due_date',
+}
 
 
 class SoftyPayDailyAllowance(models.Model):
     _name = 'softy_pay.daily.allowance'
+    _inherit = 'softy_pay.payroll.input.mixin'
     _description = "Appointements Journaliers"
 
     employee_id = fields.Many2one(
@@ -31,6 +53,34 @@ class SoftyPayDailyAllowance(models.Model):
                     _("Le taux et le plafond doivent être positifs.")
                 )
 
+    @api.model
+    def check_rule_codes(self, employee_ids=None):
+        """Contrôle ensembliste des appointements journaliers (de tous les
+        salariés, ou de ``employee_ids``), en une requête.
+
+        Retourne ``[{'id', 'employee_id', 'rule_code', 'reason'}]`` : code
+        sans rubrique salariale, ou taux supérieur au plafond.
+        """
+        self.flush_model()
+        self.env['softy_pay.rubrique.salariale'].flush_model(['code'])
+        query = """
+            SELECT a.id, a.employee_id, a.rule_code, r.id IS NULL
+              FROM softy_pay_daily_allowance a
+         LEFT JOIN softy_pay_rubrique_salariale r ON r.code = a.rule_code
+             WHERE (r.id IS NULL OR (a.ceiling > 0 AND a.rate > a.ceiling))
+        """
+        params = []
+        if employee_ids is not None:
+            query += " AND a.employee_id = ANY(%s)"
+            params.append(list(employee_ids))
+        self.env.cr.execute(query + " ORDER BY a.employee_id, a.rule_code", params)
+        return [{
+            'id': allowance_id,
+            'employee_id': employee_id,
+            'rule_code': rule_code,
+            'reason': _("Rubrique inconnue") if unknown else _("Taux supérieur au plafond"),
+        } for allowance_id, employee_id, rule_code, unknown in self.env.cr.fetchall()]
+
 
 class SoftyPayEmployeeAdditional(models.Model):
     _name = 'softy_pay.employee.additional'
@@ -74,16 +124,22 @@ class SoftyPayEmployeeFamily(models.Model):
 
 class SoftyPayEmployeeContract(models.Model):
     _name = 'softy_pay.employee.contract'
+    _inherit = 'softy_pay.history.mixin'
     _description = "Historique des Contrats Salarié"
+    _history_date_field = 'end_date'
 
     employee_id = fields.Many2one(
-        'hr.employee', "Salarié", required=True, ondelete='cascade')
+        'hr.employee', "Salarié", required=True, ondelete='cascade', index=True)
     reference = fields.Char("Réf. Contrat", required=True)
     contract_type_id = fields.Many2one(
         'hr.contract.type', "Type de Contrat", required=True)
     duration_months = fields.Integer("Durée (mois)")
     start_date = fields.Date("Début Contrat", required=True)
     end_date = fields.Date("Fin Contrat", required=True)
+    expiry_reminder_date = fields.Date(
+        "Rappel d'échéance émis le", readonly=True, copy=False,
+        help="Renseigné à l'émission du rappel : chaque échéance n'est "
+             "notifiée qu'une fois.")
 
     @api.constrains('start_date', 'end_date')
     def _check_dates(self):
@@ -93,6 +149,68 @@ class SoftyPayEmployeeContract(models.Model):
                     _("La date de fin doit être postérieure à la date de début.")
                 )
 
+    def init(self):
+        super().init()
+        create_index(self.env.cr, 'softy_pay_employee_contract_expiry_idx',
+                     self._table, ['end_date'],
+                     where='active AND expiry_reminder_date IS NULL')
+        create_index(self.env.cr, 'softy_pay_employee_contract_period_idx',
+                     self._table, ['employee_id', 'start_date', 'end_date'],
+                     where='active')
+
+    def write(self, vals):
+        if ('end_date' in vals or 'contract_type_id' in vals) \
+                and 'expiry_reminder_date' not in vals:
+            vals = dict(vals, expiry_reminder_date=False)
+        return super().write(vals)
+
+    @api.model
+    def _cron_contract_expiry_reminders(self):
+        """Planifie une activité pour chaque contrat entrant dans sa fenêtre
+        de rappel (``months_before_expiry`` du type de contrat).
+
+        Une seule requête, bornée par l'horizon de rappel le plus long, sur
+        l'index partiel des contrats non encore notifiés ; les activités sont
+        créées en lot puis les contrats marqués.
+        """
+        today = fields.Date.context_today(self)
+        self.flush_model()
+        self.env['hr.contract.type'].flush_model(['months_before_expiry'])
+        cr = self.env.cr
+        cr.execute("SELECT MAX(months_before_expiry) FROM hr_contract_type")
+        max_months = cr.fetchone()[0]
+        if not max_months or max_months <= 0:
+            return
+        cr.execute("""
+            SELECT c.id
+              FROM softy_pay_employee_contract c
+              JOIN hr_contract_type t ON t.id = c.contract_type_id
+             WHERE c.expiry_reminder_date IS NULL
+               AND c.active
+               AND c.end_date >= %(today)s
+               AND c.end_date <= %(horizon)s
+               AND t.months_before_expiry > 0
+               AND c.end_date - make_interval(months => t.months_before_expiry) <= %(today)s
+        """, {'today': today, 'horizon': today + relativedelta(months=max_months)})
+        contracts = self.browse(row[0] for row in cr.fetchall())
+        if not contracts:
+            return
+
+        activity_type = self.env.ref('mail.mail_activity_data_todo', raise_if_not_found=False)
+        res_model_id = self.env['ir.model']._get_id('hr.employee')
+        self.env['mail.activity'].sudo().create([{
+            'res_model_id': res_model_id,
+            'res_id': contract.employee_id.id,
+            'activity_type_id': activity_type.id if activity_type else False,
+            'summary': _("Échéance du contrat %s", contract.reference),
+            'date_deadline': contract.end_date,
+            'user_id': contract.employee_id.parent_id.user_id.id or self.env.user.id,
+        } for contract in contracts])
+        cr.execute(
+            "UPDATE softy_pay_employee_contract SET expiry_reminder_date = %s WHERE id = ANY(%s)",
+            [today, contracts.ids])
+        contracts.invalidate_recordset(['expiry_reminder_date'])
+
 
 class SoftyPayEmployeeDocument(models.Model):
     _name = 'softy_pay.employee.document'
@@ -146,7 +264,7 @@ class SoftyPayEmployeeExperience(models.Model):
     _description = "Expériences Salarié"
 
     employee_id = fields.Many2one(
-        'hr.employee', "Salarié", required=True, ondelete='cascade')
+        'hr.employee', "Salarié", required=True, ondelete='cascade', index=True)
     company_name = fields.Char("Nom Société", required=True)
     sector = fields.Char("Secteur d'Activité")
     function = fields.Char("Fonction")
@@ -167,7 +285,7 @@ class SoftyPayEmployeePublication(models.Model):
     _description = "Publications Salarié"
 
     employee_id = fields.Many2one(
-        'hr.employee', "Salarié", required=True, ondelete='cascade')
+        'hr.employee', "Salarié", required=True, ondelete='cascade', index=True)
     title = fields.Char("Titre", required=True)
     pub_date = fields.Date("Date de publication")
     theme = fields.Char("Thème")
@@ -198,6 +316,7 @@ class SoftyPayEmployeeSkill(models.Model):
 
 class SoftyPayEmployeeLoan(models.Model):
     _name = 'softy_pay.employee.loan'
+    _inherit = 'softy_pay.payroll.input.mixin'
     _description = "Prêts Salarié"
 
     employee_id = fields.Many2one(
@@ -211,19 +330,147 @@ class SoftyPayEmployeeLoan(models.Model):
     first_due_date = fields.Date("1re Échéance")
     last_due_date = fields.Date("Dernière Échéance")
 
+    schedule_ids = fields.One2many(
+        'softy_pay.employee.loan.schedule', 'loan_id', "Échéancier", readonly=True)
+
     _sql_constraints = [
         ('loan_unique',
          'unique(employee_id, file_number)',
          "Ce numéro de dossier existe déjà pour ce salarié.")
     ]
 
+    def init(self):
+        create_index(self.env.cr, 'softy_pay_employee_loan_period_idx',
+                     self._table, ['employee_id', 'loan_date'])
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        loans = super().create(vals_list)
+        loans._rebuild_schedule()
+        return loans
+
+    def write(self, vals):
+        res = super().write(vals)
+        if LOAN_SCHEDULE_FIELDS & vals.keys():
+            self._rebuild_schedule()
+        return res
+
+    def _rebuild_schedule(self):
+        """Régénère l'échéancier des seuls prêts de ``self``."""
+        if not self:
+            return
+        Schedule = self.env['softy_pay.employee.loan.schedule']
+        Schedule.flush_model()
+        self.env.cr.execute(
+            "DELETE FROM softy_pay_employee_loan_schedule WHERE loan_id = ANY(%s)",
+            [self.ids])
+        bulk_insert(self.env, Schedule._table, [
+            'loan_id', 'employee_id', 'due_date', 'amount', 'remaining_balance',
+        ], self._get_schedule_rows())
+        Schedule.invalidate_model()
+        self.invalidate_recordset(['schedule_ids'])
+
+    def _get_schedule_rows(self):
+        """Échéances mensuelles à partir de la 1re échéance (à défaut, un mois
+        après la date du prêt). Sans prélèvement mensuel, le montant est
+        réparti jusqu'à la dernière échéance ; la dernière échéance solde le
+        prêt."""
+        digits = self.env['decimal.precision'].precision_get('Payroll')
+        rows = []
+        for loan in self:
+            first = loan.first_due_date or loan.loan_date + relativedelta(months=1)
+            last = loan.last_due_date
+            step = loan.monthly_deduction
+            if not step and last:
+                months = (last.year - first.year) * 12 + last.month - first.month + 1
+                step = loan.amount / max(months, 1)
+            if step <= 0:
+                continue
+            remaining = float_round(loan.amount, digits)
+            k = 0
+            while remaining > 0:
+                due = first + relativedelta(months=k)
+                installment = float_round(min(step, remaining), digits)
+                if (last and due >= last) or installment <= 0:
+                    installment = remaining
+                remaining = float_round(remaining - installment, digits)
+                rows.append((loan.id, loan.employee_id.id, due, installment, remaining))
+                k += 1
+        return rows
+
+
+class SoftyPayEmployeeLoanSchedule(models.Model):
+    _name = 'softy_pay.employee.loan.schedule'
+    _description = "Échéancier de Prêt"
+    _order = 'loan_id, due_date'
+
+    loan_id = fields.Many2one(
+        'softy_pay.employee.loan', "Prêt", required=True,
+        ondelete='cascade', index=True)
+    employee_id = fields.Many2one(
+        'hr.employee', "Salarié", required=True, ondelete='cascade')
+    due_date = fields.Date("Échéance", required=True, index=True)
+    amount = fields.Float("Montant Échéance", digits='Payroll')
+    remaining_balance = fields.Float("Capital Restant Dû", digits='Payroll')
+
+    _sql_constraints = [
+        ('schedule_unique',
+         'unique(loan_id, due_date)',
+         "Une seule échéance par prêt et par date.")
+    ]
+
+    def init(self):
+        create_index(self.env.cr, 'softy_pay_employee_loan_schedule_emp_due_idx',
+                     self._table, ['employee_id', 'due_date'])
+
+    @api.model
+    def get_period_deductions(self, date_from, date_to, employee_ids=None):
+        """Prélèvement dû sur la période et capital restant dû à son terme,
+        pour tous les salariés (ou ``employee_ids``), en une lecture indexée.
+
+        Retourne ``{employee_id: (prélèvement, restant_dû)}``.
+        """
+        self.flush_model()
+        query = """
+            SELECT employee_id,
+                   COALESCE(SUM(amount) FILTER (WHERE due_date <= %(to)s), 0.0),
+                   COALESCE(SUM(amount) FILTER (WHERE due_date > %(to)s), 0.0)
+              FROM softy_pay_employee_loan_schedule
+             WHERE due_date >= %(from)s
+        """
+        params = {'from': date_from, 'to': date_to}
+        if employee_ids is not None:
+            query += " AND employee_id = ANY(%(emps)s)"
+            params['emps'] = list(employee_ids)
+        query += " GROUP BY employee_id"
+        self.env.cr.execute(query, params)
+        return {emp_id: (due, remaining) for emp_id, due, remaining in self.env.cr.fetchall()}
+
+    @api.model
+    def _get_due_by_credit(self, employee_ids, date_from, date_to):
+        """Lignes ``(employee_id, code crédit, montant)`` dues sur la période."""
+        self.flush_model()
+        self.env.cr.execute("""
+            SELECT s.employee_id, c.code, SUM(s.amount)
+              FROM softy_pay_employee_loan_schedule s
+              JOIN softy_pay_employee_loan l ON l.id = s.loan_id
+              JOIN softy_pay_credit c ON c.id = l.credit_id
+             WHERE s.employee_id = ANY(%s)
+               AND s.due_date >= %s
+               AND s.due_date <= %s
+          GROUP BY s.employee_id, c.code
+        """, [list(employee_ids), date_from, date_to])
+        return self.env.cr.fetchall()
+
 
 class SoftyPayEmployeeAbsence(models.Model):
     _name = 'softy_pay.employee.absence'
+    _inherit = ['softy_pay.payroll.input.mixin', 'softy_pay.history.mixin']
     _description = "Absences Salarié"
+    _history_date_field = 'date_start'
 
     employee_id = fields.Many2one(
-        'hr.employee', "Salarié", required=True, ondelete='cascade')
+        'hr.employee', "Salarié", required=True, ondelete='cascade', index=True)
     absence_type_id = fields.Many2one(
         'softy_pay.absence.type', "Type d'Absence", required=True)
     date_start = fields.Date("Date d'Absence", required=True)
@@ -238,10 +485,92 @@ class SoftyPayEmployeeAbsence(models.Model):
                     _("La date de reprise doit être après la date d'absence.")
                 )
 
+    def init(self):
+        super().init()
+        create_index(self.env.cr, 'softy_pay_employee_absence_period_idx',
+                     self._table, ['employee_id', 'date_start', 'date_end'],
+                     where='active')
+
+    @api.model
+    def get_period_absence_days(self, employee_ids, date_from, date_to):
+        """Jours d'absence par salarié et type d'absence sur une période.
+
+        Une seule requête ramène les absences chevauchant la période, déjà
+        bornées à celle-ci ; un unique parcours trié fusionne ensuite les
+        intervalles d'un même salarié et type. La date de reprise n'est pas
+        comptée comme jour d'absence.
+
+        Retourne ``{'employee_ids', 'type_ids', 'days', 'overlaps'}`` où
+        ``days`` est une matrice numpy salarié × type (ordre des listes d'ids)
+        et ``overlaps`` la liste des ``(employee_id, absence_id, absence_id)``
+        qui se chevauchent.
+        """
+        if np is None:
+            raise UserError(_("Le décompte des absences nécessite la librairie numpy."))
+        self.flush_model(['employee_id', 'absence_type_id', 'date_start', 'date_end', 'active'])
+        employee_ids = sorted(set(employee_ids))
+        # historique archivé : lu seulement avec active_test=False (audits)
+        archived = "AND active" if self.env.context.get('active_test', True) else ""
+        self.env.cr.execute("""
+            SELECT employee_id, absence_type_id, id,
+                   GREATEST(date_start, %(from)s),
+                   LEAST(date_end, %(to)s + 1)
+              FROM softy_pay_employee_absence
+             WHERE employee_id = ANY(%(emps)s)
+               AND date_start <= %(to)s
+               AND date_end > %(from)s
+               {archived}
+          ORDER BY employee_id, date_start, id
+        """.format(archived=archived), {'emps': employee_ids, 'from': date_from, 'to': date_to})
+        rows = self.env.cr.fetchall()
+
+        type_ids = sorted({row[1] for row in rows})
+        row_of = {emp_id: i for i, emp_id in enumerate(employee_ids)}
+        col_of = {type_id: j for j, type_id in enumerate(type_ids)}
+        days = np.zeros((len(employee_ids), len(type_ids)), dtype=np.int32)
+        overlaps = []
+
+        current_emp = None
+        open_by_type = {}               # type -> [début, fin) en cours de fusion
+        last_end, last_id = None, None  # absence la plus tardive du salarié
+        for emp_id, type_id, absence_id, start, end in rows:
+            start, end = start.toordinal(), end.toordinal()
+            if emp_id != current_emp:
+                self._flush_intervals(days, row_of.get(current_emp), col_of, open_by_type)
+                current_emp, open_by_type = emp_id, {}
+                last_end, last_id = None, None
+            if last_end is not None and start < last_end:
+                overlaps.append((emp_id, last_id, absence_id))
+            if last_end is None or end > last_end:
+                last_end, last_id = end, absence_id
+            interval = open_by_type.get(type_id)
+            if interval and start <= interval[1]:
+                interval[1] = max(interval[1], end)
+            else:
+                if interval:
+                    days[row_of[emp_id], col_of[type_id]] += interval[1] - interval[0]
+                open_by_type[type_id] = [start, end]
+        self._flush_intervals(days, row_of.get(current_emp), col_of, open_by_type)
+        return {
+            'employee_ids': employee_ids,
+            'type_ids': type_ids,
+            'days': days,
+            'overlaps': overlaps,
+        }
+
+    @staticmethod
+    def _flush_intervals(days, row, col_of, open_by_type):
+        if row is None:
+            return
+        for type_id, (start, end) in open_by_type.items():
+            days[row, col_of[type_id]] += end - start
+
 
 class SoftyPayEmployeeAccident(models.Model):
     _name = 'softy_pay.employee.accident'
+    _inherit = 'softy_pay.history.mixin'
     _description = "Accidents de Travail Salarié"
+    _history_date_field = 'accident_date'
 
     employee_id = fields.Many2one(
         'hr.employee', "Salarié", required=True, ondelete='cascade')
@@ -266,3 +595,9 @@ class SoftyPayEmployeeAccident(models.Model):
                 raise ValidationError(
                     _("Le degré de gravité et les jours d’arrêt doivent être ≥ 0.")
                 )
+
+    def init(self):
+        super().init()
+        create_index(self.env.cr, 'softy_pay_employee_accident_period_idx',
+                     self._table, ['employee_id', 'accident_date'],
+                     where='active')
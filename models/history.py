@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+# pyright: reportAttributeAccessIssue=false, reportArgumentType=false
+import datetime
+import logging
+
+from psycopg2 import sql
+
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError
+from odoo.tools import create_index
+
+_logger = logging.getLogger(__name__)
+
+
+class SoftyPayHistoryMixin(models.AbstractModel):
+    """Historique archivable par année.
+
+    Les lignes antérieures à une date sont archivées (``active`` faux) : les
+    index partiels ``WHERE active`` et le filtre implicite de l'ORM limitent
+    les requêtes de période aux données vivantes, tandis que l'historique
+    reste lisible avec ``active_test=False``. Une année archivée peut ensuite
+    être détachée dans une table froide (``<table>_y<année>``), sauvegardée,
+    déplacée ou supprimée indépendamment, puis rattachée pour un audit.
+
+    Ces opérations (DDL compris) sont privées : appelées par une tâche de
+    maintenance ou un shell, jamais exposées par RPC.
+    """
+    _name = 'softy_pay.history.mixin'
+    _description = "Historique archivable par année"
+
+    # Champ date qui situe une ligne dans une année.
+    _history_date_field = None
+
+    active = fields.Boolean("Actif", default=True)
+
+    def init(self):
+        super().init()
+        if self._history_date_field:
+            create_index(self.env.cr, '%s_archived_year_idx' % self._table, self._table,
+                         [self._history_date_field], where='NOT active')
+
+    @api.model
+    def _archive_history(self, before):
+        """Archive en une requête les lignes antérieures à ``before``."""
+        self.flush_model()
+        self.env.cr.execute(sql.SQL("""
+            UPDATE {table} SET active = false
+             WHERE active AND {date} < %s
+        """).format(table=sql.Identifier(self._table),
+                    date=sql.Identifier(self._history_date_field)), [before])
+        count = self.env.cr.rowcount
+        self.invalidate_model(['active'])
+        _logger.info("%s : %d lignes archivées avant le %s", self._name, count, before)
+        return count
+
+    @api.model
+    def _detach_year(self, year, tablespace=None):
+        """Déplace les lignes archivées de ``year`` dans une table froide.
+
+        Les lignes encore actives de l'année sont laissées en place. Retourne
+        l'enregistrement ``softy_pay.history.archive`` de la table froide.
+        """
+        year = int(year)
+        Archive = self.env['softy_pay.history.archive']
+        if Archive.search_count([('model', '=', self._name), ('year', '=', year)]):
+            raise UserError(_("L'année %(year)s de %(model)s est déjà détachée.",
+                              year=year, model=self._description))
+        cold = '%s_y%d' % (self._table, year)
+        table = sql.Identifier(self._table)
+        self.flush_model()
+        cr = self.env.cr
+        cr.execute(sql.SQL("CREATE TABLE {cold} (LIKE {table} INCLUDING DEFAULTS){space}").format(
+            cold=sql.Identifier(cold), table=table,
+            space=sql.SQL(" TABLESPACE {}").format(sql.Identifier(tablespace))
+            if tablespace else sql.SQL('')))
+        cr.execute(sql.SQL("""
+            WITH moved AS (
+                DELETE FROM {table}
+                 WHERE NOT active AND {date} >= %s AND {date} < %s
+             RETURNING *
+            )
+            INSERT INTO {cold} SELECT * FROM moved
+        """).format(table=table, cold=sql.Identifier(cold),
+                    date=sql.Identifier(self._history_date_field)),
+            [datetime.date(year, 1, 1), datetime.date(year + 1, 1, 1)])
+        count = cr.rowcount
+        self.invalidate_model()
+        _logger.info("%s : %d lignes de %d détachées dans %s", self._name, count, year, cold)
+        return Archive.create({
+            'model': self._name, 'year': year, 'table_name': cold, 'row_count': count,
+        })
+
+    @api.model
+    def _attach_year(self, year):
+        """Réintègre la table froide de ``year`` (lignes archivées) puis la
+        supprime. Les lignes dont le salarié n'existe plus sont abandonnées."""
+        archive = self.env['softy_pay.history.archive'].search(
+            [('model', '=', self._name), ('year', '=', year)])
+        if not archive:
+            raise UserError(_("L'année %(year)s de %(model)s n'est pas détachée.",
+                              year=year, model=self._description))
+        cr = self.env.cr
+        # colonnes de la table froide : le modèle a pu gagner des champs depuis
+        cr.execute("""
+            SELECT column_name FROM information_schema.columns
+             WHERE table_name = %s ORDER BY ordinal_position
+        """, [archive.table_name])
+        columns = sql.SQL(', ').join(sql.Identifier(row[0]) for row in cr.fetchall())
+        cold = sql.Identifier(archive.table_name)
+        cr.execute(sql.SQL("""
+            INSERT INTO {table} ({columns})
+            SELECT {columns} FROM {cold} cold
+             WHERE EXISTS (SELECT 1 FROM hr_employee e WHERE e.id = cold.employee_id)
+        """).format(table=sql.Identifier(self._table), cold=cold, columns=columns))
+        count = cr.rowcount
+        cr.execute(sql.SQL("DROP TABLE {cold}").format(cold=cold))
+        self.invalidate_model()
+        if count < archive.row_count:
+            _logger.warning("%s : %d lignes de %d sans salarié non réintégrées",
+                            self._name, archive.row_count - count, year)
+        archive.unlink()
+        return count
+
+
+class SoftyPayHistoryArchive(models.Model):
+    _name = 'softy_pay.history.archive'
+    _description = "Année d'historique détachée"
+    _order = 'model, year desc'
+
+    model       = fields.Char("Modèle", required=True, readonly=True)
+    year        = fields.Integer("Année", required=True, readonly=True)
+    table_name  = fields.Char("Table froide", required=True, readonly=True)
+    row_count   = fields.Integer("Lignes", readonly=True)
+
+    _sql_constraints = [
+        ('model_year_unique', 'unique(model, year)',
+         "Cette année est déjà détachée pour ce modèle."),
+    ]
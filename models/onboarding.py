@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+# pyright: reportAttributeAccessIssue=false, reportArgumentType=false
+import csv
+import io
+import logging
+
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError
+
+from .sql_tools import bulk_insert
+
+_logger = logging.getLogger(__name__)
+
+# Champs salarié repris tels quels du payload.
+ONBOARDING_EMPLOYEE_FIELDS = (
+    'name', 'cin', 'birth_date', 'gender', 'home_address', 'city', 'mobile_phone',
+    'contract_start_date', 'contract_end_date', 'payment_type', 'time_entry_type',
+    'salary', 'salary_periodicity', 'payment_mode', 'cash_account',
+    'bank_matricule', 'bank_name',
+)
+ONBOARDING_DATE_FIELDS = ('birth_date', 'contract_start_date', 'contract_end_date')
+ONBOARDING_SELECTION_FIELDS = (
+    'gender', 'payment_type', 'payment_mode', 'salary_periodicity', 'time_entry_type',
+)
+
+
+def _to_date(value):
+    return fields.Date.to_date(value) if value not in (None, '') else None
+
+
+class SoftyPayEmployeeOnboarding(models.AbstractModel):
+    _name = 'softy_pay.employee.onboarding'
+    _description = "Intégration en masse des salariés"
+
+    @api.model
+    def onboard(self, rows, department_id, batch_size=2000):
+        """Crée en masse les salariés d'un département client et leurs
+        affiliations, membres de famille et contrats.
+
+        ``rows`` est une liste de dictionnaires : champs salarié
+        (``ONBOARDING_EMPLOYEE_FIELDS``), codes ``service``, ``contract_type``,
+        noms ``qualification`` et ``profile``, et listes ``affiliations``
+        (``type``, ``numero``, ``date_start``, ``date_end``), ``family``
+        (``name``, ``relationship``, ``birth_date``) et ``contracts``
+        (``reference``, ``contract_type``, ``start_date``, ``end_date``,
+        ``duration_months``).
+
+        Le payload est validé en mémoire, les codes résolus en une requête par
+        table de référence. Les salariés valides sont créés par lots ORM (sans
+        suivi), les tables filles par insertions multi-lignes. Une ligne en
+        erreur est écartée sans bloquer les autres : si la création d'un lot
+        échoue malgré la validation, ses lignes sont reprises une à une pour
+        isoler la fautive.
+
+        Retourne ``{'employee_ids', 'errors': [{'row', 'errors'}]}``.
+        """
+        department = self.env['hr.department'].browse(department_id).exists()
+        if not department:
+            raise UserError(_("Département client introuvable."))
+        refs = self._resolve_references(rows, department)
+        errors = []
+        valid = []
+        for index, row in enumerate(rows):
+            try:
+                vals, children, row_errors = self._validate_row(row, department, refs)
+            except (TypeError, ValueError) as e:
+                vals, children, row_errors = None, None, [_("Ligne invalide : %s", e)]
+            if row_errors:
+                errors.append({'row': index, 'errors': row_errors})
+            else:
+                valid.append((index, vals, children))
+
+        Employee = self.env['hr.employee'].with_context(
+            tracking_disable=True, mail_create_nolog=True,
+            mail_create_nosubscribe=True, set_based_checks=True)
+        employee_ids = []
+        for start in range(0, len(valid), batch_size):
+            batch = valid[start:start + batch_size]
+            try:
+                with self.env.cr.savepoint():
+                    employees = Employee.create([vals for _index, vals, _children in batch])
+            except Exception:
+                employees = Employee
+                created = []
+                for index, vals, children in batch:
+                    try:
+                        with self.env.cr.savepoint():
+                            employees |= Employee.create(vals)
+                        created.append((index, vals, children))
+                    except Exception as e:
+                        errors.append({'row': index, 'errors': [str(e)]})
+                batch = created
+            self._insert_children(employees.ids, [children for _index, _vals, children in batch])
+            employee_ids.extend(employees.ids)
+        errors.sort(key=lambda error: error['row'])
+        _logger.info("Intégration %s : %d salariés créés, %d lignes rejetées",
+                     department.display_name, len(employee_ids), len(errors))
+        return {'employee_ids': employee_ids, 'errors': errors}
+
+    @api.model
+    def onboard_csv(self, file, department_id, delimiter=';'):
+        """Variante CSV de ``onboard`` : une ligne par salarié, en-têtes aux
+        noms des champs. Les colonnes ``affiliation.<code type>`` portent le
+        numéro d'affiliation ; les colonnes ``contract.<champ>`` décrivent un
+        contrat unique."""
+        if isinstance(file, bytes):
+            file = io.StringIO(file.decode('utf-8-sig'))
+        rows = []
+        for record in csv.DictReader(file, delimiter=delimiter):
+            row = {'affiliations': [], 'contracts': []}
+            contract = {}
+            for column, value in record.items():
+                value = (value or '').strip()
+                if column.startswith('affiliation.'):
+                    if value:
+                        row['affiliations'].append(
+                            {'type': column.split('.', 1)[1], 'numero': value})
+                elif column.startswith('contract.'):
+                    if value:
+                        contract[column.split('.', 1)[1]] = value
+                elif value:
+                    row[column] = value
+            if contract:
+                row['contracts'].append(contract)
+            rows.append(row)
+        return self.onboard(rows, department_id)
+
+    # -------------------------------------------------------------------------
+    # Validation en mémoire
+    # -------------------------------------------------------------------------
+    @api.model
+    def _resolve_references(self, rows, department):
+        """Codes et noms du payload résolus en une requête par table."""
+        def collect(key, nested=None):
+            values = set()
+            for row in rows:
+                items = row.get(nested) or [] if nested else [row]
+                values.update(item.get(key) for item in items if item.get(key))
+            return values
+
+        Cache = self.env['softy_pay.code.cache']
+        contract_types = collect('contract_type') | collect('contract_type', 'contracts')
+        services = self.env['softy_pay.service'].search_read([
+            ('department_id', '=', department.id), ('code', 'in', list(collect('service'))),
+        ], ['code'])
+        cins = collect('cin')
+        existing = self.env['hr.employee'].with_context(active_test=False).search_read(
+            [('cin', 'in', list(cins))], ['cin']) if cins else []
+        return {
+            'affiliation_type': Cache.resolve_codes(
+                'softy_pay.affiliation.type', collect('type', 'affiliations')),
+            'relationship': Cache.resolve_codes(
+                'softy_pay.relationship', collect('relationship', 'family')),
+            'contract_type': Cache.resolve_codes('hr.contract.type', contract_types),
+            'service': {s['code']: s['id'] for s in services},
+            'qualification': self._ids_by_name('softy_pay.qualification', collect('qualification')),
+            'profile': self._ids_by_name('softy_pay.employee.profile', collect('profile')),
+            'existing_cins': {emp['cin'] for emp in existing},
+            'seen_cins': set(),
+        }
+
+    @api.model
+    def _ids_by_name(self, model, names):
+        if not names:
+            return {}
+        return {rec['name']: rec['id']
+                for rec in self.env[model].search_read([('name', 'in', list(names))], ['name'])}
+
+    @api.model
+    def _validate_row(self, row, department, refs):
+        """Retourne ``(vals salarié, enfants, erreurs)`` pour une ligne."""
+        errors = []
+        vals = {field: row[field] for field in ONBOARDING_EMPLOYEE_FIELDS if row.get(field) is not None}
+        vals.update(department_id=department.id, company_id=department.company_id.id)
+
+        if not row.get('name'):
+            errors.append(_("Nom manquant"))
+        cin = row.get('cin')
+        if not cin:
+            errors.append(_("CIN manquante"))
+        elif cin in refs['existing_cins']:
+            errors.append(_("CIN déjà attribuée : %s", cin))
+        elif cin in refs['seen_cins']:
+            errors.append(_("CIN en double dans le fichier : %s", cin))
+        else:
+            refs['seen_cins'].add(cin)
+
+        Employee = self.env['hr.employee']
+        for field in ONBOARDING_SELECTION_FIELDS:
+            if vals.get(field) not in (None, '', False) \
+                    and vals[field] not in Employee._fields[field].get_values(self.env):
+                errors.append(_("Valeur invalide (%(field)s) : %(value)s",
+                                field=field, value=vals[field]))
+        for field in ONBOARDING_DATE_FIELDS:
+            try:
+                if field in vals:
+                    vals[field] = _to_date(vals[field])
+            except ValueError:
+                errors.append(_("Date invalide (%s) : %s", field, vals[field]))
+        if vals.get('salary') not in (None, ''):
+            try:
+                vals['salary'] = float(vals['salary'])
+            except (TypeError, ValueError):
+                errors.append(_("Salaire non numérique : %s", vals['salary']))
+
+        for key, field, label in (
+                ('service', 'service_id', _("Service")),
+                ('contract_type', 'contract_type_id', _("Type de contrat")),
+                ('qualification', 'qualification_id', _("Qualification")),
+                ('profile', 'profile_id', _("Profil"))):
+            if row.get(key):
+                if row[key] in refs[key]:
+                    vals[field] = refs[key][row[key]]
+                else:
+                    errors.append(_("%(label)s inconnu : %(code)s", label=label, code=row[key]))
+
+        children = {'affiliations': [], 'family': [], 'contracts': []}
+        periods = {}
+        for aff in row.get('affiliations') or []:
+            type_id = refs['affiliation_type'].get(aff.get('type'))
+            if not type_id:
+                errors.append(_("Type d'affiliation inconnu : %s", aff.get('type')))
+                continue
+            if not aff.get('numero'):
+                errors.append(_("Numéro d'affiliation manquant (%s)", aff.get('type')))
+                continue
+            try:
+                start = _to_date(aff.get('date_start')) or fields.Date.context_today(self)
+                end = _to_date(aff.get('date_end'))
+            except ValueError:
+                errors.append(_("Date d'affiliation invalide (%s)", aff.get('type')))
+                continue
+            # insertion directe : la contrainte de non-chevauchement est
+            # vérifiée ici
+            if end and end < start:
+                errors.append(_("Affiliation %s : fin antérieure au début", aff.get('type')))
+            elif any((not other_end or other_end >= start) and (not end or end >= other_start)
+                     for other_start, other_end in periods.get(type_id, ())):
+                errors.append(_("Affiliations %s qui se chevauchent", aff.get('type')))
+            else:
+                periods.setdefault(type_id, []).append((start, end))
+                children['affiliations'].append((type_id, aff['numero'], start, end, True))
+
+        seen_members = set()
+        for member in row.get('family') or []:
+            relationship_id = refs['relationship'].get(member.get('relationship'))
+            if not member.get('name') or not relationship_id:
+                errors.append(_("Membre de famille incomplet ou lien inconnu : %s",
+                                member.get('name') or member.get('relationship')))
+            elif (relationship_id, member['name']) in seen_members:
+                errors.append(_("Membre de famille en double : %s", member['name']))
+            else:
+                seen_members.add((relationship_id, member['name']))
+                try:
+                    children['family'].append((
+                        member['name'], relationship_id, _to_date(member.get('birth_date'))))
+                except ValueError:
+                    errors.append(_("Date de naissance invalide : %s", member['name']))
+
+        for contract in row.get('contracts') or []:
+            type_id = refs['contract_type'].get(contract.get('contract_type'))
+            try:
+                start, end = _to_date(contract.get('start_date')), _to_date(contract.get('end_date'))
+            except ValueError:
+                errors.append(_("Dates de contrat invalides : %s", contract.get('reference')))
+                continue
+            try:
+                duration = int(contract.get('duration_months') or 0)
+            except (TypeError, ValueError):
+                errors.append(_("Durée de contrat non numérique : %s", contract.get('reference')))
+                continue
+            if not contract.get('reference') or not type_id or not start or not end:
+                errors.append(_("Contrat incomplet ou type inconnu : %s", contract.get('reference')))
+            elif end < start:
+                errors.append(_("Contrat %s : fin antérieure au début", contract['reference']))
+            else:
+                children['contracts'].append((
+                    contract['reference'], type_id, duration, start, end, True))
+        return vals, children, errors
+
+    # -------------------------------------------------------------------------
+    # Écriture
+    # -------------------------------------------------------------------------
+    @api.model
+    def _insert_children(self, employee_ids, children_list):
+        affiliations, family, contracts = [], [], []
+        for employee_id, children in zip(employee_ids, children_list):
+            affiliations.extend((employee_id,) + aff for aff in children['affiliations'])
+            family.extend((employee_id,) + member for member in children['family'])
+            contracts.extend((employee_id,) + contract for contract in children['contracts'])
+        bulk_insert(self.env, 'softy_pay_employee_affiliation', [
+            'employee_id', 'type_id', 'numero', 'date_start', 'date_end', 'active',
+        ], affiliations)
+        bulk_insert(self.env, 'softy_pay_employee_family', [
+            'employee_id', 'name', 'relationship_id', 'birth_date',
+        ], family)
+        bulk_insert(self.env, 'softy_pay_employee_contract', [
+            'employee_id', 'reference', 'contract_type_id', 'duration_months',
+            'start_date', 'end_date', 'active',
+        ], contracts)
+        self.env['softy_pay.employee.affiliation']._invalidate_affiliations_at()
+        for model in ('softy_pay.employee.affiliation', 'softy_pay.employee.family',
+                      'softy_pay.employee.contract'):
+            self.env[model].invalidate_model()
+        self.env['hr.employee'].browse(employee_ids).invalidate_recordset(
+            ['affiliation_ids', 'dependent_ids', 'contract_ids'])
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+# pyright: reportAttributeAccessIssue=false, reportArgumentType=false
+import logging
+
+from odoo import api, models, _
+from odoo.exceptions import UserError
+
+from .payroll_profiler import PayrollProfiler
+
+_logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+except ImportError:
+    _logger.debug("numpy introuvable : le moteur de paie est indisponible.")
+    np = None
+
+
+RUBRIQUE_FIELDS = [
+    'code', 'gain_or_deduction', 'taxable', 'rate', 'base_field',
+    'operation', 'coefficient', 'ceiling_amount', 'ceiling_action',
+    'fixed_or_calc', 'tax_code',
+]
+
+
+class SoftyPayPayrollEngine(models.AbstractModel):
+    _name = 'softy_pay.payroll.engine'
+    _description = "Moteur de Paie Vectorisé"
+
+    # -------------------------------------------------------------------------
+    # Point d'entrée
+    # -------------------------------------------------------------------------
+    @api.model
+    def compute(self, employee_ids, date_from, date_to, profile=False):
+        """Calcule les rubriques salariales de ``employee_ids`` sur la période.
+
+        Les entrées sont chargées une seule fois sous forme de colonnes
+        (une ligne par salarié, une colonne par rubrique) puis chaque rubrique
+        est appliquée à toute la population en une opération numpy.
+
+        Avec ``profile``, le résultat porte sous ``'profile'`` la durée et le
+        nombre de requêtes par étape, rubrique et barème.
+        """
+        profiler = PayrollProfiler(self.env.cr, enabled=profile)
+        inputs = self._load_inputs(employee_ids, date_from, date_to, profiler)
+        result = self._compute_batch(inputs, profiler)
+        if profile:
+            result['profile'] = profiler.entries
+        return result
+
+    # -------------------------------------------------------------------------
+    # Chargement des entrées : une requête par source
+    # -------------------------------------------------------------------------
+    @api.model
+    def _load_inputs(self, employee_ids, date_from, date_to, profiler=None):
+        profiler = profiler or PayrollProfiler(self.env.cr, enabled=False)
+        if np is None:
+            raise UserError(_("Le moteur de paie nécessite la librairie numpy."))
+        self.env['hr.employee'].flush_model(['salary'])
+        self.env['softy_pay.pointage.line'].flush_model()
+        self.env['softy_pay.daily.allowance'].flush_model()
+        cr = self.env.cr
+
+        emp_ids = np.unique(np.asarray(list(employee_ids), dtype=np.int64))
+        emp_list = emp_ids.tolist()
+        Rubrique = self.env['softy_pay.rubrique.salariale']
+        with profiler.measure('stage', "Chargement rubriques"):
+            rubriques, rub_ids, _codes, _columns = Rubrique._get_rule_index()
+            tax_codes = list({r['tax_code'] for r in rubriques if r['tax_code']})
+            baremes = {
+                b['code']: b['id']
+                for b in self.env['softy_pay.bareme'].search_read(
+                    [('code', 'in', tax_codes)], ['code'])
+            } if tax_codes else {}
+        shape = (len(emp_ids), len(rubriques))
+
+        with profiler.measure('stage', "Chargement salaires"):
+            salary = np.zeros(len(emp_ids))
+            cr.execute("""
+                SELECT id, COALESCE(salary, 0.0)
+                  FROM hr_employee
+                 WHERE id = ANY(%s)
+            """, [emp_list])
+            rows = cr.fetchall()
+            if rows:
+                ids, amounts = zip(*rows)
+                salary[np.searchsorted(emp_ids, ids)] = amounts
+
+        with profiler.measure('stage', "Chargement pointage"):
+            values = np.zeros(shape)
+            entered = np.zeros(shape, dtype=bool)
+            cr.execute("""
+                SELECT employee_id, rubrique_id, SUM(value)
+                  FROM softy_pay_pointage_line
+                 WHERE employee_id = ANY(%s)
+                   AND date_from >= %s
+                   AND date_to <= %s
+              GROUP BY employee_id, rubrique_id
+            """, [emp_list, date_from, date_to])
+            rows = cr.fetchall()
+            if rows:
+                e_ids, r_ids, amounts = zip(*rows)
+                i = np.searchsorted(emp_ids, e_ids)
+                j = np.searchsorted(rub_ids, r_ids)
+                values[i, j] = amounts
+                entered[i, j] = True
+
+        with profiler.measure('stage', "Chargement appointements"):
+            coefficients = np.full(shape, np.nan)
+            ceilings = np.full(shape, np.nan)
+            cr.execute("""
+                SELECT employee_id, rule_code, COALESCE(rate, 0.0), NULLIF(ceiling, 0.0)
+                  FROM softy_pay_daily_allowance
+                 WHERE employee_id = ANY(%s)
+            """, [emp_list])
+            rows = cr.fetchall()
+            if rows:
+                e_ids, codes, rates, ceils = zip(*rows)
+                j, known = Rubrique.resolve_rule_columns(codes)
+                i = np.searchsorted(emp_ids, e_ids)[known]
+                coefficients[i, j[known]] = np.asarray(rates, dtype=float)[known]
+                ceilings[i, j[known]] = np.asarray(ceils, dtype=float)[known]
+
+        with profiler.measure('stage', "Chargement prêts"):
+            loans = np.zeros(len(emp_ids))
+            loan_lines = self.env['softy_pay.employee.loan.schedule']._get_due_by_credit(
+                emp_list, date_from, date_to)
+            if loan_lines:
+                e_ids, _codes, amounts = zip(*loan_lines)
+                np.add.at(loans, np.searchsorted(emp_ids, e_ids), amounts)
+
+        return {
+            'date': date_to,
+            'employee_ids': emp_ids,
+            'rubriques': [dict(rub) for rub in rubriques],
+            'baremes': baremes,
+            'rubrique_ids': rub_ids,
+            'salary': salary,
+            'values': values,
+            'entered': entered,
+            'coefficients': coefficients,
+            'ceilings': ceilings,
+            'loans': loans,
+            'loan_lines': loan_lines,
+        }
+
+    # -------------------------------------------------------------------------
+    # Calcul vectorisé
+    # -------------------------------------------------------------------------
+    @api.model
+    def _compute_batch(self, inputs, profiler=None):
+        """Applique chaque rubrique à toute la population.
+
+        - mode *fixe* : montant saisi au pointage, à défaut le taux de
+          l'appointement journalier du salarié ;
+        - mode *calculé* : base (salaire ou valeur de pointage) combinée au
+          coefficient (surchargé par l'appointement journalier), puis au taux,
+          ou au barème désigné par ``tax_code`` résolu sur tout le vecteur ;
+        - le plafond (rubrique ou appointement) est appliqué selon
+          ``ceiling_action`` ;
+        - les échéances de prêts de la période s'ajoutent aux retenues ;
+        - les charges patronales sont calculées sur le salaire ou le brut
+          imposable de toute la population.
+        """
+        profiler = profiler or PayrollProfiler(self.env.cr, enabled=False)
+        emp_ids = inputs['employee_ids']
+        rubriques = inputs['rubriques']
+        salary = inputs['salary']
+        Bareme = self.env['softy_pay.bareme']
+        digits = self.env['decimal.precision'].precision_get('Payroll')
+        amounts = np.zeros(inputs['values'].shape)
+        warnings = []
+
+        for j, rub in enumerate(rubriques):
+            with profiler.measure('rubrique', rub['code']):
+                value = inputs['values'][:, j]
+                entered = inputs['entered'][:, j]
+                override = inputs['coefficients'][:, j]
+                has_override = ~np.isnan(override)
+
+                if rub['fixed_or_calc'] == 'fixed':
+                    amount = np.where(
+                        entered, value, np.where(has_override, override, 0.0))
+                else:
+                    coef = np.where(has_override, override, rub['coefficient'])
+                    if rub['base_field'] == 'salary':
+                        amount = self._apply_operation(salary, rub['operation'], coef)
+                    else:
+                        amount = self._apply_operation(value, rub['operation'], coef)
+                        amount = np.where(entered, amount, 0.0)
+                    bareme_id = inputs['baremes'].get(rub['tax_code'])
+                    if bareme_id:
+                        with profiler.measure('bareme', rub['tax_code']):
+                            rates = Bareme.resolve_rates(bareme_id, inputs['date'], amount)
+                        amount = amount * (rates / 100.0)
+                    elif rub['rate']:
+                        amount = amount * (rub['rate'] / 100.0)
+
+                ceiling = inputs['ceilings'][:, j]
+                ceiling = np.where(np.isnan(ceiling), rub['ceiling_amount'] or 0.0, ceiling)
+                over = (ceiling > 0) & (amount > ceiling)
+                if over.any() and rub['ceiling_action'] != 'autoriser':
+                    warnings.extend((int(e), rub['code']) for e in emp_ids[over])
+                    if rub['ceiling_action'] == 'interdire':
+                        amount = np.where(over, ceiling, amount)
+
+                amounts[:, j] = np.round(amount, digits)
+
+        gain = np.asarray([r['gain_or_deduction'] == 'gain' for r in rubriques], dtype=bool)
+        taxable = np.asarray([bool(r['taxable']) for r in rubriques], dtype=bool)
+        gross = amounts[:, gain].sum(axis=1)
+        brut_impo = amounts[:, gain & taxable].sum(axis=1)
+        deductions = amounts[:, ~gain].sum(axis=1) + inputs['loans']
+        with profiler.measure('stage', "Charges patronales"):
+            patronal_rubriques, patronal = self.env['softy_pay.rubrique.patronale'] \
+                .compute_contributions(emp_ids, salary, brut_impo)
+        return {
+            'employee_ids': emp_ids,
+            'rubrique_ids': inputs['rubrique_ids'],
+            'rubriques': rubriques,
+            'amounts': amounts,
+            'gain': gain,
+            'taxable': taxable,
+            'gross': gross,
+            'brut_impo': brut_impo,
+            'deductions': deductions,
+            'net': gross - deductions,
+            'loan_lines': inputs['loan_lines'],
+            'patronal_rubriques': patronal_rubriques,
+            'patronal': patronal,
+            'warnings': warnings,
+        }
+
+    @staticmethod
+    def _apply_operation(base, operation, coef):
+        if operation == 'div':
+            return np.divide(base, coef, out=np.zeros_like(base), where=coef != 0)
+        if operation == 'add':
+            return base + coef
+        if operation == 'sub':
+            return base - coef
+        return base * coef
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""Instrumentation légère des calculs de paie."""
+import time
+from contextlib import contextmanager
+
+
+class PayrollProfiler:
+    """Cumule durée, requêtes SQL et nombre d'appels par ``(type, nom)``.
+
+    Désactivé, ``measure`` ne fait rien : l'instrumentation peut rester en
+    place dans le moteur sans coût. Les mesures (``entries``) sont un simple
+    dictionnaire, transmissible entre processus.
+    """
+
+    def __init__(self, cr, enabled=True):
+        self.cr = cr
+        self.enabled = enabled
+        self.entries = {}
+
+    @contextmanager
+    def measure(self, kind, name):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        queries = self.cr.sql_log_count
+        try:
+            yield
+        finally:
+            entry = self.entries.setdefault((kind, name), [0.0, 0, 0])
+            entry[0] += time.perf_counter() - start
+            entry[1] += self.cr.sql_log_count - queries
+            entry[2] += 1
+
+    def merge(self, entries):
+        for key, (duration, queries, calls) in entries.items():
+            entry = self.entries.setdefault(key, [0.0, 0, 0])
+            entry[0] += duration
+            entry[1] += queries
+            entry[2] += calls
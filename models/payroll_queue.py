@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+# pyright: reportAttributeAccessIssue=false, reportArgumentType=false
+import json
+import logging
+import os
+import socket
+import threading
+from contextlib import contextmanager
+
+from psycopg2.errors import SerializationFailure
+
+from odoo import api, fields, models
+
+_logger = logging.getLogger(__name__)
+
+# Un lot « en cours » dont le battement de cœur est plus ancien est considéré
+# comme abandonné (worker arrêté) et peut être repris.
+STALE_HEARTBEAT_SECONDS = 900
+
+# Au-delà de ce nombre de tentatives, un lot passe en échec.
+MAX_BATCH_ATTEMPTS = 3
+
+# Période de rafraîchissement du battement de cœur pendant le calcul d'un lot.
+HEARTBEAT_INTERVAL_SECONDS = STALE_HEARTBEAT_SECONDS // 5
+
+# Lot sans battement de cœur récent, ni à la réservation ni pendant le calcul.
+STALE_CONDITION = """
+    {batch}.heartbeat < (now() at time zone 'UTC') - make_interval(secs => %(stale)s)
+    AND NOT EXISTS (
+        SELECT 1 FROM softy_pay_payroll_job_heartbeat hb
+         WHERE hb.batch_id = {batch}.id
+           AND hb.beat_at >= (now() at time zone 'UTC') - make_interval(secs => %(stale)s))
+"""
+
+
+class BatchLost(Exception):
+    """Le lot a été repris par un autre worker pendant son calcul."""
+
+
+@contextmanager
+def _heartbeat(registry, batch_id, worker):
+    """Rafraîchit le battement de cœur du lot, dans sa propre transaction,
+    tant que le bloc s'exécute.
+
+    Il est écrit dans ``softy_pay_payroll_job_heartbeat`` et non sur le lot :
+    la transaction de calcul (REPEATABLE READ) échouerait sinon en validant
+    l'état ``done`` d'une ligne modifiée depuis son instantané.
+    """
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(HEARTBEAT_INTERVAL_SECONDS):
+            try:
+                with registry.cursor() as cr:
+                    cr.execute("""
+                        INSERT INTO softy_pay_payroll_job_heartbeat (batch_id, worker, beat_at)
+                        SELECT id, worker, now() at time zone 'UTC'
+                          FROM softy_pay_payroll_job_batch
+                         WHERE id = %s AND state = 'running' AND worker = %s
+                        ON CONFLICT (batch_id) DO UPDATE
+                        SET worker = EXCLUDED.worker, beat_at = EXCLUDED.beat_at
+                    """, [batch_id, worker])
+            except Exception:
+                _logger.warning("Battement de cœur du lot %s non enregistré", batch_id,
+                                exc_info=True)
+
+    thread = threading.Thread(target=beat, name='softy_pay_heartbeat_%s' % batch_id,
+                              daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+class SoftyPayPayrollJob(models.Model):
+    _name = 'softy_pay.payroll.job'
+    _description = "Calcul de Paie en File d'Attente"
+    _order = 'id desc'
+
+    run_id      = fields.Many2one(
+        'softy_pay.payroll.run', "Campagne",
+        required=True, ondelete='cascade', index=True)
+    state       = fields.Selection([
+        ('running', "En cours"),
+        ('done', "Terminé"),
+        ('failed', "En échec")],
+        "État", default='running', required=True, readonly=True)
+    started_at  = fields.Datetime("Mis en file le", readonly=True)
+    snapshot    = fields.Char("Instantané de mise en file", readonly=True)
+    finished_at = fields.Datetime("Terminé le", readonly=True)
+    batch_ids   = fields.One2many(
+        'softy_pay.payroll.job.batch', 'job_id', "Lots", readonly=True)
+    batch_count = fields.Integer("Lots", readonly=True)
+    done_count  = fields.Integer("Lots terminés", compute='_compute_progress')
+    progress    = fields.Float("Avancement (%)", compute='_compute_progress')
+
+    def _compute_progress(self):
+        groups = self.env['softy_pay.payroll.job.batch']._read_group(
+            [('job_id', 'in', self.ids), ('state', '=', 'done')], ['job_id'], ['__count'])
+        done = {job.id: count for job, count in groups}
+        for job in self:
+            job.done_count = done.get(job.id, 0)
+            job.progress = 100.0 * job.done_count / job.batch_count if job.batch_count else 0.0
+
+    @api.model
+    def enqueue(self, run, shards):
+        """Crée le travail de ``run`` : un lot par liste d'ids de ``shards``."""
+        return self.create({
+            'run_id': run.id,
+            'started_at': self.env.cr.now(),
+            # les lots, calculés après validation, en voient au moins autant
+            'snapshot': self.env['softy_pay.payroll.change'].current_snapshot(),
+            'batch_count': len(shards),
+            'batch_ids': [(0, 0, {'sequence': seq, 'employee_ids': shard})
+                          for seq, shard in enumerate(shards)],
+        })
+
+    @api.model
+    def process_queue(self, max_batches=0, worker=None):
+        """Traite les lots en attente jusqu'à épuisement (ou ``max_batches``).
+
+        Chaque lot est réservé, calculé et enregistré dans ses propres
+        transactions : un arrêt brutal ne perd que le lot en cours, repris par
+        un autre worker une fois son battement de cœur expiré. Plusieurs
+        workers peuvent vider la file en parallèle (``SKIP LOCKED``). Seules
+        les données validées en base sont visibles : la mise en file doit
+        être committée. Retourne le nombre de lots traités.
+        """
+        worker = worker or '%s:%d' % (socket.gethostname(), os.getpid())
+        registry = self.env.registry
+        processed = 0
+        while not max_batches or processed < max_batches:
+            try:
+                with registry.cursor() as cr:
+                    env = api.Environment(cr, self.env.uid, self.env.context)
+                    batch_id, expired_jobs = env['softy_pay.payroll.job.batch']._claim(worker)
+            except SerializationFailure:
+                continue
+            for job_id in expired_jobs:
+                self._finalize(job_id)
+            if not batch_id:
+                break
+            try:
+                with _heartbeat(registry, batch_id, worker), registry.cursor() as cr:
+                    env = api.Environment(cr, self.env.uid, self.env.context)
+                    job_id = env['softy_pay.payroll.job.batch'].browse(batch_id)._process(worker)
+            except (BatchLost, SerializationFailure):
+                _logger.info("Lot %s repris par un autre worker : résultat abandonné", batch_id)
+                continue
+            except Exception as e:
+                _logger.exception("Lot de paie %s en échec", batch_id)
+                with registry.cursor() as cr:
+                    env = api.Environment(cr, self.env.uid, self.env.context)
+                    job_id = env['softy_pay.payroll.job.batch'].browse(batch_id)._record_failure(
+                        worker, str(e))
+            processed += 1
+            if job_id:
+                self._finalize(job_id)
+        return processed
+
+    @api.model
+    def _cron_process_queue(self):
+        return self.process_queue()
+
+    @api.model
+    def _finalize(self, job_id):
+        """Clôt le travail si tous ses lots sont traités, dans une transaction
+        distincte : celle du dernier lot validé voit donc tous les autres.
+        Une campagne clôturée entre-temps n'est pas rouverte."""
+        try:
+            with self.env.registry.cursor() as cr:
+                # verrou : la campagne ne peut être clôturée avant la fin de
+                # cette transaction
+                cr.execute("""
+                    SELECT r.state
+                      FROM softy_pay_payroll_run r
+                      JOIN softy_pay_payroll_job j ON j.run_id = r.id
+                     WHERE j.id = %s
+                       FOR UPDATE OF r
+                """, [job_id])
+                run_row = cr.fetchone()
+                cr.execute("""
+                    UPDATE softy_pay_payroll_job j
+                       SET state = CASE WHEN EXISTS (
+                                SELECT 1 FROM softy_pay_payroll_job_batch b
+                                 WHERE b.job_id = j.id AND b.state = 'failed')
+                                THEN 'failed' ELSE 'done' END,
+                           finished_at = now() at time zone 'UTC'
+                     WHERE j.id = %s AND j.state = 'running'
+                       AND NOT EXISTS (
+                                SELECT 1 FROM softy_pay_payroll_job_batch b
+                                 WHERE b.job_id = j.id AND b.state IN ('pending', 'running'))
+                 RETURNING j.state
+                """, [job_id])
+                row = cr.fetchone()
+                if not row or row[0] != 'done':
+                    return
+                env = api.Environment(cr, self.env.uid, self.env.context)
+                job = env['softy_pay.payroll.job'].browse(job_id)
+                if not run_row or run_row[0] == 'done':
+                    _logger.info("Campagne %s clôturée : résultat du travail %s non reporté",
+                                 job.run_id.name, job_id)
+                    return
+                warnings = [
+                    tuple(warning)
+                    for batch in job.batch_ids for warning in batch.warnings or []
+                ]
+                job.run_id.write({
+                    'state': 'computed',
+                    'computed_at': job.started_at,
+                    'computed_snapshot': job.snapshot,
+                    'warning_message': job.run_id._format_warnings(warnings),
+                })
+                _logger.info("Campagne %s calculée : %d lots", job.run_id.name, job.batch_count)
+        except SerializationFailure:
+            # clôturé en parallèle par un autre worker
+            pass
+
+
+class SoftyPayPayrollJobBatch(models.Model):
+    _name = 'softy_pay.payroll.job.batch'
+    _description = "Lot de Calcul de Paie"
+    _order = 'job_id, sequence'
+
+    job_id       = fields.Many2one(
+        'softy_pay.payroll.job', "Travail",
+        required=True, ondelete='cascade', index=True)
+    sequence     = fields.Integer("Ordre", required=True)
+    employee_ids = fields.Json("Salariés", required=True)
+    state        = fields.Selection([
+        ('pending', "En attente"),
+        ('running', "En cours"),
+        ('done', "Terminé"),
+        ('failed', "En échec")],
+        "État", default='pending', required=True, index=True)
+    worker       = fields.Char("Worker")
+    heartbeat    = fields.Datetime("Battement de cœur")
+    attempts     = fields.Integer("Tentatives", default=0)
+    warnings     = fields.Json("Avertissements")
+    error        = fields.Text("Erreur")
+
+    @api.model
+    def _claim(self, worker):
+        """Réserve le prochain lot disponible : en attente, ou en cours mais
+        abandonné. Retourne ``(batch_id ou None, travaux à clôturer)`` ; les
+        lots abandonnés trop souvent, ou d'une campagne clôturée depuis leur
+        mise en file, passent en échec."""
+        cr = self.env.cr
+        stale = {'stale': STALE_HEARTBEAT_SECONDS, 'max': MAX_BATCH_ATTEMPTS, 'worker': worker}
+        cr.execute("""
+            UPDATE softy_pay_payroll_job_batch
+               SET state = 'failed', error = 'Battement de cœur expiré'
+             WHERE state = 'running' AND attempts >= %(max)s
+               AND {stale}
+         RETURNING job_id
+        """.format(stale=STALE_CONDITION.format(batch='softy_pay_payroll_job_batch')), stale)
+        expired_jobs = {row[0] for row in cr.fetchall()}
+        cr.execute("""
+            UPDATE softy_pay_payroll_job_batch b
+               SET state = 'failed', error = 'Campagne clôturée'
+              FROM softy_pay_payroll_job j
+              JOIN softy_pay_payroll_run r ON r.id = j.run_id
+             WHERE j.id = b.job_id AND j.state = 'running' AND r.state = 'done'
+               AND (b.state = 'pending'
+                    OR (b.state = 'running' AND {stale}))
+         RETURNING b.job_id
+        """.format(stale=STALE_CONDITION.format(batch='b')), stale)
+        expired_jobs.update(row[0] for row in cr.fetchall())
+        cr.execute("""
+            UPDATE softy_pay_payroll_job_batch
+               SET state = 'running', worker = %(worker)s,
+                   heartbeat = now() at time zone 'UTC', attempts = COALESCE(attempts, 0) + 1
+             WHERE id = (
+                    SELECT b.id
+                      FROM softy_pay_payroll_job_batch b
+                      JOIN softy_pay_payroll_job j ON j.id = b.job_id
+                      JOIN softy_pay_payroll_run r ON r.id = j.run_id
+                     WHERE j.state = 'running' AND r.state != 'done'
+                       AND (b.state = 'pending'
+                            OR (b.state = 'running' AND b.attempts < %(max)s AND {stale}))
+                  ORDER BY b.job_id, b.sequence
+                     LIMIT 1
+                       FOR UPDATE OF b SKIP LOCKED)
+         RETURNING id
+        """.format(stale=STALE_CONDITION.format(batch='b')), stale)
+        row = cr.fetchone()
+        return (row[0] if row else None), expired_jobs
+
+    def _process(self, worker):
+        """Calcule et enregistre le lot ; le point de reprise (état ``done``)
+        est validé dans la même transaction que les résultats. Le lot d'une
+        campagne clôturée passe en échec sans être calculé."""
+        self.ensure_one()
+        run = self.job_id.run_id
+        # verrou partagé : la campagne ne peut être clôturée pendant le calcul
+        self.env.cr.execute(
+            "SELECT state FROM softy_pay_payroll_run WHERE id = %s FOR SHARE", [run.id])
+        if self.env.cr.fetchone()[0] == 'done':
+            self.env.cr.execute("""
+                UPDATE softy_pay_payroll_job_batch
+                   SET state = 'failed', error = 'Campagne clôturée'
+                 WHERE id = %s AND state = 'running' AND worker = %s
+            """, [self.id, worker])
+            if not self.env.cr.rowcount:
+                raise BatchLost(self.id)
+            self.invalidate_recordset()
+            return self.job_id.id
+        result = self.env['softy_pay.payroll.engine'].compute(
+            self.employee_ids, run.date_from, run.date_to)
+        run._store_results(result)
+        self.env.flush_all()
+        self.env.cr.execute("""
+            UPDATE softy_pay_payroll_job_batch
+               SET state = 'done', warnings = %s::jsonb, error = NULL,
+                   heartbeat = now() at time zone 'UTC'
+             WHERE id = %s AND state = 'running' AND worker = %s
+        """, [json.dumps([list(w) for w in result['warnings']]), self.id, worker])
+        if not self.env.cr.rowcount:
+            raise BatchLost(self.id)
+        self.invalidate_recordset()
+        return self.job_id.id
+
+    def _record_failure(self, worker, message):
+        self.ensure_one()
+        self.env.cr.execute("""
+            UPDATE softy_pay_payroll_job_batch
+               SET state = CASE WHEN attempts >= %s THEN 'failed' ELSE 'pending' END,
+                   error = %s
+             WHERE id = %s AND state = 'running' AND worker = %s
+        """, [MAX_BATCH_ATTEMPTS, message, self.id, worker])
+        self.invalidate_recordset()
+        return self.job_id.id
+
+
+class SoftyPayPayrollJobHeartbeat(models.Model):
+    _name = 'softy_pay.payroll.job.heartbeat'
+    _description = "Battement de cœur d'un lot en cours de calcul"
+    _log_access = False
+
+    batch_id    = fields.Many2one(
+        'softy_pay.payroll.job.batch', "Lot", required=True, ondelete='cascade')
+    worker      = fields.Char("Worker", required=True)
+    beat_at     = fields.Datetime("Dernier battement", required=True)
+
+    _sql_constraints = [
+        ('batch_unique', 'unique(batch_id)', "Un seul battement de cœur par lot."),
+    ]
@@ -0,0 +1,424 @@
+# -*- coding: utf-8 -*-
+# pyright: reportAttributeAccessIssue=false, reportArgumentType=false
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from odoo import api, fields, models, sql_db, _
+from odoo.exceptions import UserError, ValidationError
+from odoo.modules.registry import Registry
+
+from .payroll_profiler import PayrollProfiler
+from .sql_tools import bulk_insert
+
+_logger = logging.getLogger(__name__)
+
+# Pools de connexions hérités du processus parent : gardés en vie pour que
+# leur destruction dans un worker ne ferme pas les sockets du parent.
+_inherited_pools = []
+
+# Nombre de salariés les plus lents conservés dans les statistiques d'une campagne.
+SLOWEST_EMPLOYEES = 20
+
+
+def _init_shard_worker(dbname):
+    # Le pool de connexions du parent (privé : sql_db._Pool) est mis de côté
+    # au profit d'un pool propre au processus fils.
+    _inherited_pools.append(sql_db._Pool)
+    sql_db._Pool = None
+    Registry(dbname)._db = sql_db.db_connect(dbname)
+
+
+def _compute_shard(dbname, uid, context, employee_ids, date_from, date_to, profile):
+    """Calcule un lot de salariés dans un processus séparé, avec son propre
+    curseur, en lecture seule : l'écriture est faite par le parent."""
+    registry = Registry(dbname)
+    with registry.cursor() as cr:
+        env = api.Environment(cr, uid, context)
+        result = env['softy_pay.payroll.engine'].compute(
+            employee_ids, date_from, date_to, profile=profile)
+        cr.rollback()
+    return result
+
+
+class SoftyPayPayrollRun(models.Model):
+    _name = 'softy_pay.payroll.run'
+    _description = "Campagne de Paie"
+    _order = 'date_from desc, id desc'
+
+    name        = fields.Char("Libellé", required=True)
+    company_id  = fields.Many2one(
+        'res.company', "Société", required=True,
+        default=lambda self: self.env.company.id)
+    date_from   = fields.Date("Début Période", required=True)
+    date_to     = fields.Date("Fin Période", required=True)
+    state       = fields.Selection([
+        ('draft', "Brouillon"),
+        ('computed', "Calculée"),
+        ('done', "Clôturée")],
+        "État", default='draft', required=True)
+    computed_at = fields.Datetime("Calculée le", readonly=True)
+    computed_snapshot = fields.Char(
+        "Instantané du calcul", readonly=True, copy=False,
+        help="Instantané de transaction du dernier calcul : les modifications "
+             "qui n'y étaient pas visibles sont reprises par le calcul incrémental.")
+    line_ids    = fields.One2many(
+        'softy_pay.payroll.run.line', 'run_id', "Lignes de Paie")
+    warning_message = fields.Text("Avertissements", readonly=True)
+    shard_by    = fields.Selection([
+        ('department', "Département"),
+        ('service', "Service")],
+        "Découpage parallèle", default='department', required=True)
+    shard_size  = fields.Integer(
+        "Taille max. d'un lot", default=2000,
+        help="Les groupes plus grands sont découpés en lots de cette taille.")
+    max_workers = fields.Integer(
+        "Processus", help="0 : un processus par cœur disponible.")
+    profile_mode = fields.Selection([
+        ('none', "Désactivé"),
+        ('stages', "Par étape"),
+        ('full', "Complet")],
+        "Profilage", default='none', required=True,
+        help="Par étape : durée et requêtes par étape, rubrique et barème. "
+             "Complet : en plus, chaque salarié est recalculé seul et "
+             "chronométré (diagnostic seulement, coûteux).")
+    stat_ids    = fields.One2many(
+        'softy_pay.payroll.run.stat', 'run_id', "Statistiques", readonly=True)
+    job_ids     = fields.One2many(
+        'softy_pay.payroll.job', 'run_id', "Calculs en file", readonly=True)
+
+    @api.constrains('date_from', 'date_to')
+    def _check_dates(self):
+        for rec in self:
+            if rec.date_to < rec.date_from:
+                raise ValidationError(
+                    _("La fin de période doit être postérieure au début.")
+                )
+
+    def _get_employees(self):
+        self.ensure_one()
+        return self.env['hr.employee'].search(
+            [('company_id', '=', self.company_id.id)])
+
+    def action_compute(self):
+        engine = self.env['softy_pay.payroll.engine']
+        for run in self:
+            if run.state == 'done':
+                raise UserError(_("La campagne %s est clôturée.", run.name))
+            started = self.env.cr.now()
+            snapshot = self.env['softy_pay.payroll.change'].current_snapshot()
+            profiler = PayrollProfiler(self.env.cr, enabled=run.profile_mode != 'none')
+            employees = run._get_employees()
+            result = engine.compute(
+                employees.ids, run.date_from, run.date_to, profile=profiler.enabled)
+            with profiler.measure('stage', "Écriture résultats"):
+                run._delete_lines_outside(employees.ids)
+                run._store_results(result)
+            if profiler.enabled:
+                profiler.merge(result['profile'])
+                run._store_profile(profiler, employees)
+            run.write({
+                'state': 'computed',
+                'computed_at': started,
+                'computed_snapshot': snapshot,
+                'warning_message': run._format_warnings(result['warnings']),
+            })
+        return True
+
+    def action_compute_incremental(self):
+        """Recalcule uniquement les salariés dont les entrées de paie ont
+        changé depuis le dernier calcul de la campagne.
+
+        Les modifications sont suivies par ``softy_pay.payroll.change`` :
+        saisies du salarié et de ses tables filles, mais aussi rubriques,
+        barèmes et rubriques patronales, qui marquent exactement leur
+        population. Les salariés sortis du périmètre de la campagne perdent
+        leurs lignes. Une campagne jamais calculée est calculée en entier.
+        """
+        engine = self.env['softy_pay.payroll.engine']
+        for run in self:
+            if run.state == 'done':
+                raise UserError(_("La campagne %s est clôturée.", run.name))
+            if run.state != 'computed' or not run.computed_snapshot:
+                run.action_compute()
+                continue
+            started = self.env.cr.now()
+            Change = self.env['softy_pay.payroll.change']
+            snapshot = Change.current_snapshot()
+            changed = Change.get_changed(run.computed_snapshot)
+            in_scope = set(run._get_employees().ids)
+            left = sorted(changed - in_scope)
+            if left:
+                self.env['softy_pay.payroll.run.line'].flush_model()
+                self.env.cr.execute("""
+                    DELETE FROM softy_pay_payroll_run_line
+                     WHERE run_id = %s AND employee_id = ANY(%s)
+                """, [run.id, left])
+                self.env['softy_pay.payroll.run.line'].invalidate_model()
+                run.invalidate_recordset(['line_ids'])
+            warnings = (run.warning_message or '').splitlines()
+            todo = sorted(changed & in_scope)
+            if todo:
+                result = engine.compute(todo, run.date_from, run.date_to)
+                run._store_results(result)
+                warnings += (run._format_warnings(result['warnings']) or '').splitlines()
+            _logger.info("Campagne %s : %d salariés recalculés, %d retirés",
+                         run.name, len(todo), len(left))
+            run.write({
+                'computed_at': started,
+                'computed_snapshot': snapshot,
+                'warning_message': "\n".join(dict.fromkeys(warnings)) or False,
+            })
+        return True
+
+    def action_compute_parallel(self):
+        """Calcule la campagne en parallèle, un processus par lot.
+
+        Les salariés de la société sont regroupés par département ou service
+        (``shard_by``) puis découpés en lots d'au plus ``shard_size``. Chaque
+        lot est calculé dans un processus distinct avec son propre curseur :
+        seules les données déjà validées en base sont visibles. Les résultats
+        sont fusionnés par le processus courant ; cette écriture remplace les
+        lignes des salariés calculés et peut donc être rejouée sans risque.
+
+        Les processus sont créés par ``fork`` : réservé à un processus dédié
+        (shell, worker de tâches planifiées en mode prefork). Dans un serveur
+        à plusieurs threads, où un fork peut hériter de verrous tenus par
+        d'autres threads, la campagne est calculée en série.
+        """
+        for run in self:
+            if run.state == 'done':
+                raise UserError(_("La campagne %s est clôturée.", run.name))
+            shards = run._get_shards()
+            workers = min(run.max_workers or os.cpu_count() or 1, len(shards))
+            if workers > 1 and threading.active_count() > 1:
+                _logger.warning("Campagne %s : processus multi-thread, fork refusé, "
+                                "calcul en série", run.name)
+                workers = 1
+            if workers <= 1:
+                run.action_compute()
+                continue
+            started = self.env.cr.now()
+            # les processus lisent des instantanés postérieurs à celui-ci
+            snapshot = self.env['softy_pay.payroll.change'].current_snapshot()
+            profiler = PayrollProfiler(self.env.cr, enabled=run.profile_mode != 'none')
+            args = [
+                (self.env.cr.dbname, self.env.uid, dict(self.env.context),
+                 shard, run.date_from, run.date_to, profiler.enabled)
+                for shard in shards
+            ]
+            _logger.info("Campagne %s : %d lots sur %d processus",
+                         run.name, len(shards), workers)
+            with ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context('fork'),
+                    initializer=_init_shard_worker,
+                    initargs=(self.env.cr.dbname,)) as executor:
+                results = list(executor.map(_compute_shard, *zip(*args)))
+            run._delete_lines_outside([emp_id for shard in shards for emp_id in shard])
+            warnings = []
+            for result in results:
+                with profiler.measure('stage', "Écriture résultats"):
+                    run._store_results(result)
+                warnings.extend(result['warnings'])
+                if profiler.enabled:
+                    profiler.merge(result['profile'])
+            if profiler.enabled:
+                run._store_profile(profiler, run._get_employees())
+            run.write({
+                'state': 'computed',
+                'computed_at': started,
+                'computed_snapshot': snapshot,
+                'warning_message': run._format_warnings(warnings),
+            })
+        return True
+
+    def action_enqueue(self):
+        """Met la campagne en file d'attente au lieu de la calculer dans la
+        requête courante : un lot par groupe de ``_get_shards``, traité par
+        ``softy_pay.payroll.job.process_queue`` (tâche planifiée ou workers
+        lancés en parallèle). Retourne les travaux créés.
+        """
+        Job = self.env['softy_pay.payroll.job']
+        jobs = Job
+        for run in self:
+            if run.state == 'done':
+                raise UserError(_("La campagne %s est clôturée.", run.name))
+            if Job.search_count([('run_id', '=', run.id), ('state', '=', 'running')]):
+                raise UserError(_("La campagne %s est déjà en file d'attente.", run.name))
+            shards = run._get_shards()
+            run._delete_lines_outside([emp_id for shard in shards for emp_id in shard])
+            jobs |= Job.enqueue(run, shards)
+        return jobs
+
+    def _get_shards(self):
+        """Listes d'ids salariés regroupés selon ``shard_by``."""
+        self.ensure_one()
+        employees = self._get_employees()
+        employees.flush_recordset(['department_id', 'service_id'])
+        # _get_employees est limité à la société de la campagne
+        key = {
+            'department': 'department_id',
+            'service': 'department_id, service_id',
+        }[self.shard_by]
+        self.env.cr.execute("""
+            SELECT id, ({key})::text
+              FROM hr_employee
+             WHERE id = ANY(%s)
+          ORDER BY {key}, id
+        """.format(key=key), [employees.ids])
+        groups = defaultdict(list)
+        for emp_id, group in self.env.cr.fetchall():
+            groups[group].append(emp_id)
+        size = max(self.shard_size, 1)
+        return [
+            ids[start:start + size]
+            for ids in groups.values()
+            for start in range(0, len(ids), size)
+        ]
+
+    def _delete_lines_outside(self, employee_ids):
+        """Supprime les lignes des salariés hors de la population calculée
+        (archivés, changés de société depuis le calcul précédent) : un
+        calcul complet ne remplace que les lignes des salariés calculés."""
+        self.ensure_one()
+        Line = self.env['softy_pay.payroll.run.line']
+        Line.flush_model()
+        self.env.cr.execute("""
+            DELETE FROM softy_pay_payroll_run_line
+             WHERE run_id = %s AND NOT employee_id = ANY(%s)
+        """, [self.id, list(employee_ids)])
+        if self.env.cr.rowcount:
+            Line.invalidate_model()
+            self.invalidate_recordset(['line_ids'])
+
+    def _store_profile(self, profiler, employees):
+        """Enregistre les mesures du profileur et, en mode complet, les
+        salariés les plus lents.
+
+        En mode complet, chaque salarié est recalculé seul hors écriture pour
+        isoler son coût propre ; ce diagnostic multiplie le temps de calcul.
+        """
+        self.ensure_one()
+        cr = self.env.cr
+        engine = self.env['softy_pay.payroll.engine']
+        timings = []
+        if self.profile_mode == 'full':
+            for employee in employees:
+                queries = cr.sql_log_count
+                start = time.perf_counter()
+                engine.compute(employee.ids, self.date_from, self.date_to)
+                timings.append((time.perf_counter() - start, cr.sql_log_count - queries, employee))
+            timings.sort(key=lambda timing: timing[0], reverse=True)
+
+        vals_list = [{
+            'run_id': self.id, 'kind': kind, 'name': name,
+            'duration': duration, 'query_count': queries, 'calls': calls,
+        } for (kind, name), (duration, queries, calls) in profiler.entries.items()]
+        vals_list += [{
+            'run_id': self.id, 'kind': 'employee',
+            'name': employee.matricule or employee.name, 'employee_id': employee.id,
+            'duration': duration, 'query_count': queries, 'calls': 1,
+        } for duration, queries, employee in timings[:SLOWEST_EMPLOYEES]]
+        self.stat_ids.unlink()
+        self.env['softy_pay.payroll.run.stat'].create(vals_list)
+
+    def _format_warnings(self, warnings):
+        if not warnings:
+            return False
+        employees = self.env['hr.employee'].browse({emp_id for emp_id, code in warnings})
+        matricules = {emp.id: emp.matricule for emp in employees}
+        return "\n".join(
+            _("Plafond dépassé : salarié %(matricule)s, rubrique %(code)s",
+              matricule=matricules.get(emp_id) or emp_id, code=code)
+            for emp_id, code in warnings)
+
+    def _store_results(self, result):
+        """Remplace les lignes de la campagne pour les salariés calculés.
+
+        Seuls les montants non nuls sont écrits, en insertions multi-lignes.
+        """
+        self.ensure_one()
+        Line = self.env['softy_pay.payroll.run.line']
+        Line.flush_model()
+        emp_ids = result['employee_ids'].tolist()
+        self.env.cr.execute("""
+            DELETE FROM softy_pay_payroll_run_line
+             WHERE run_id = %s AND employee_id = ANY(%s)
+        """, [self.id, emp_ids])
+
+        rubriques = result['rubriques']
+        amounts = result['amounts']
+        rows = []
+        for i, j in zip(*amounts.nonzero()):
+            rub = rubriques[j]
+            rows.append((
+                self.id, emp_ids[i], rub['id'], rub['code'],
+                rub['gain_or_deduction'], bool(rub['taxable']),
+                float(amounts[i, j]), self.date_to, True,
+            ))
+        patronal = result['patronal']
+        for i, j in zip(*patronal.nonzero()):
+            rows.append((
+                self.id, emp_ids[i], None, result['patronal_rubriques'][j]['code'],
+                'patronal', False, float(patronal[i, j]), self.date_to, True,
+            ))
+        for emp_id, credit_code, amount in result['loan_lines']:
+            rows.append((self.id, emp_id, None, credit_code, 'retenue', False, amount,
+                         self.date_to, True))
+        bulk_insert(self.env, Line._table, [
+            'run_id', 'employee_id', 'rubrique_id', 'code',
+            'line_type', 'taxable', 'amount', 'date', 'active',
+        ], rows)
+        Line.invalidate_model()
+        self.invalidate_recordset(['line_ids'])
+
+
+class SoftyPayPayrollRunLine(models.Model):
+    _name = 'softy_pay.payroll.run.line'
+    _inherit = 'softy_pay.history.mixin'
+    _description = "Ligne de Paie"
+    _history_date_field = 'date'
+    _order = 'run_id, employee_id, id'
+
+    run_id      = fields.Many2one(
+        'softy_pay.payroll.run', "Campagne",
+        required=True, ondelete='cascade', index=True)
+    employee_id = fields.Many2one(
+        'hr.employee', "Salarié", required=True, ondelete='cascade')
+    rubrique_id = fields.Many2one(
+        'softy_pay.rubrique.salariale', "Rubrique", ondelete='set null')
+    code        = fields.Char("Code", required=True)
+    line_type   = fields.Selection([
+        ('gain', "Gain"),
+        ('retenue', "Retenue"),
+        ('patronal', "Charge patronale")],
+        "Type", required=True)
+    taxable     = fields.Boolean("Imposable")
+    amount      = fields.Float("Montant", digits='Payroll')
+    date        = fields.Date("Fin Période", required=True)
+
+
+class SoftyPayPayrollRunStat(models.Model):
+    _name = 'softy_pay.payroll.run.stat'
+    _description = "Statistique de Campagne de Paie"
+    _order = 'run_id, kind, duration desc'
+
+    run_id      = fields.Many2one(
+        'softy_pay.payroll.run', "Campagne",
+        required=True, ondelete='cascade', index=True)
+    kind        = fields.Selection([
+        ('stage', "Étape"),
+        ('rubrique', "Rubrique"),
+        ('bareme', "Barème"),
+        ('employee', "Salarié")],
+        "Type", required=True)
+    name        = fields.Char("Élément", required=True)
+    employee_id = fields.Many2one('hr.employee', "Salarié", ondelete='cascade')
+    duration    = fields.Float("Durée (s)", digits=(12, 6))
+    query_count = fields.Integer("Requêtes SQL")
+    calls       = fields.Integer("Appels")
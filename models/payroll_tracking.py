@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+# pyright: reportAttributeAccessIssue=false, reportArgumentType=false
+from odoo import api, fields, models
+from odoo.tools import create_index
+
+
+class SoftyPayPayrollChange(models.Model):
+    """Marque de recalcul par salarié.
+
+    Chaque marque porte l'identifiant de la transaction qui l'a posée
+    (colonne SQL ``change_xid``, hors ORM : ``bigint``). Un calcul retient
+    l'instantané de sa transaction (``current_snapshot``) ; les salariés à
+    recalculer sont ceux dont la marque n'y était pas visible. Contrairement
+    à un horodatage, une transaction commencée avant le calcul mais validée
+    après n'est jamais perdue.
+    """
+    _name = 'softy_pay.payroll.change'
+    _description = "Salarié dont les entrées de paie ont changé"
+    _log_access = False
+
+    employee_id = fields.Many2one(
+        'hr.employee', "Salarié", required=True, ondelete='cascade')
+    changed_at  = fields.Datetime("Modifié le", required=True, index=True)
+
+    _sql_constraints = [
+        ('employee_unique', 'unique(employee_id)',
+         "Une seule marque de modification par salarié."),
+    ]
+
+    def init(self):
+        self.env.cr.execute("""
+            ALTER TABLE softy_pay_payroll_change ADD COLUMN IF NOT EXISTS change_xid bigint
+        """)
+        create_index(self.env.cr, 'softy_pay_payroll_change_xid_idx', self._table, ['change_xid'])
+
+    @api.model
+    def mark(self, employee_ids):
+        """Marque ``employee_ids`` comme à recalculer (horodatage de la
+        transaction), en une seule requête."""
+        employee_ids = [emp_id for emp_id in set(employee_ids) if emp_id]
+        if employee_ids:
+            self.mark_query("SELECT unnest(%(employees)s::int[])", {'employees': employee_ids})
+
+    @api.model
+    def mark_query(self, query, params=None):
+        """Marque la population désignée par ``query`` (une colonne : l'id
+        salarié). Utilisé pour les changements de règles globales."""
+        self.env.flush_all()
+        self.env.cr.execute("""
+            INSERT INTO softy_pay_payroll_change (employee_id, changed_at, change_xid)
+            SELECT DISTINCT population.employee_id, now() at time zone 'UTC', txid_current()
+              FROM ({query}) AS population (employee_id)
+             WHERE population.employee_id IS NOT NULL
+            ON CONFLICT (employee_id) DO UPDATE
+            SET changed_at = EXCLUDED.changed_at, change_xid = EXCLUDED.change_xid
+        """.format(query=query), params or {})
+        self.invalidate_model()
+
+    @api.model
+    def current_snapshot(self):
+        """Instantané de la transaction courante, à conserver avec le
+        résultat d'un calcul (texte ``txid_snapshot``)."""
+        self.env.cr.execute("SELECT txid_current_snapshot()::text")
+        return self.env.cr.fetchone()[0]
+
+    @api.model
+    def get_changed(self, snapshot):
+        """Ids des salariés dont la marque n'était pas visible dans
+        ``snapshot`` : modifiés après, ou par une transaction encore en cours
+        à ce moment-là."""
+        self.flush_model()
+        self.env.cr.execute("""
+            SELECT employee_id FROM softy_pay_payroll_change
+             WHERE change_xid >= txid_snapshot_xmin(%(snapshot)s::txid_snapshot)
+               AND NOT txid_visible_in_snapshot(change_xid, %(snapshot)s::txid_snapshot)
+        """, {'snapshot': snapshot})
+        return {row[0] for row in self.env.cr.fetchall()}
+
+
+class SoftyPayPayrollInputMixin(models.AbstractModel):
+    """Entrée de paie rattachée à un salarié : toute création, modification
+    (des champs ``_payroll_input_fields``, tous par défaut) ou suppression
+    marque le salarié à recalculer."""
+    _name = 'softy_pay.payroll.input.mixin'
+    _description = "Entrée de paie suivie"
+
+    _payroll_input_fields = None
+
+    def _get_payroll_employee_ids(self):
+        return self.mapped('employee_id').ids
+
+    def _mark_payroll_changed(self):
+        self.env['softy_pay.payroll.change'].mark(self._get_payroll_employee_ids())
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        records._mark_payroll_changed()
+        return records
+
+    def write(self, vals):
+        tracked = self._payroll_input_fields is None \
+            or not self._payroll_input_fields.isdisjoint(vals)
+        if tracked and 'employee_id' in vals:
+            self._mark_payroll_changed()
+        res = super().write(vals)
+        if tracked:
+            self._mark_payroll_changed()
+        return res
+
+    def unlink(self):
+        self._mark_payroll_changed()
+        return super().unlink()
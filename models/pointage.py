@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+# pyright: reportAttributeAccessIssue=false, reportArgumentType=false
+from odoo import api, fields, models, _
+from odoo.exceptions import ValidationError
+
+
+class SoftyPayPointageLine(models.Model):
+    _name = 'softy_pay.pointage.line'
+    _inherit = 'softy_pay.payroll.input.mixin'
+    _description = "Ligne de Pointage"
+    _order = 'date_from desc, employee_id, rubrique_id'
+
+    employee_id = fields.Many2one(
+        'hr.employee', "Salarié", required=True, ondelete='cascade')
+    rubrique_id = fields.Many2one(
+        'softy_pay.rubrique.salariale', "Rubrique",
+        required=True, ondelete='cascade')
+    date_from   = fields.Date("Début Période", required=True)
+    date_to     = fields.Date("Fin Période", required=True)
+    value       = fields.Float(
+        "Valeur", digits='Payroll',
+        help="Jours, heures ou montant saisi selon la base de la rubrique.")
+
+    _sql_constraints = [
+        ('pointage_unique',
+         'unique(employee_id, rubrique_id, date_from)',
+         "Une seule valeur de pointage par salarié, rubrique et période."),
+    ]
+
+    # Les écritures ORM versionnent aussi les cellules de grille (les
+    # écritures SQL de l'import et de grid_apply le font elles-mêmes).
+    def _log_grid_cells(self):
+        self.env['softy_pay.pointage.grid.change'].log_pointage(
+            (line.employee_id.id, line.rubrique_id.id) for line in self)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        lines = super().create(vals_list)
+        lines._log_grid_cells()
+        return lines
+
+    def write(self, vals):
+        if 'employee_id' in vals or 'rubrique_id' in vals:
+            self._log_grid_cells()
+        res = super().write(vals)
+        self._log_grid_cells()
+        return res
+
+    def unlink(self):
+        self._log_grid_cells()
+        return super().unlink()
+
+    @api.constrains('date_from', 'date_to')
+    def _check_dates(self):
+        for rec in self:
+            if rec.date_to < rec.date_from:
+                raise ValidationError(
+                    _("La fin de période doit être postérieure au début.")
+                )
@@ -1,7 +1,46 @@
 # -*- coding: utf-8 -*-
 # pyright: reportAttributeAccessIssue=false, reportArgumentType=false
-from odoo import api, fields, models, _
-from odoo.exceptions import ValidationError
+import io
+import logging
+from collections import defaultdict
+
+from odoo import api, fields, models, tools, _
+from odoo.exceptions import UserError, ValidationError
+from odoo.tools import create_index
+
+from .payroll_engine import RUBRIQUE_FIELDS
+from .sql_tools import bulk_insert
+from .transfer_file import FixedWidthFile, ascii_field, cents, deliver_file
+
+_logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+except ImportError:
+    _logger.debug("numpy introuvable : l'index des barèmes est indisponible.")
+    np = None
+
+try:
+    from openpyxl import load_workbook
+except ImportError:
+    _logger.debug("openpyxl introuvable : l'import Excel est indisponible.")
+    load_workbook = None
+
+# Écart toléré entre deux tranches consécutives : les barèmes sont usuellement
+# saisis en unités entières (0 - 30 000, 30 001 - 50 000, ...).
+BRACKET_STEP = 1.0
+
+# Nombre de salariés par page de la grille de pointage.
+GRID_PAGE_SIZE = 200
+
+
+def _cell_text(value):
+    """Texte normalisé d'une cellule (``123.0`` lu par Excel devient ``'123'``)."""
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
 
 
 class SoftyPayRubriqueSalariale(models.Model):
@@ -49,6 +88,85 @@ class SoftyPayRubriqueSalariale(models.Model):
         ('rub_code_unique', 'unique(code)', "Le code de rubrique doit être unique."),
     ]
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        rubriques = super().create(vals_list)
+        self.env.registry.clear_cache()
+        rubriques._mark_payroll_population()
+        return rubriques
+
+    def write(self, vals):
+        tracked = not set(RUBRIQUE_FIELDS).isdisjoint(vals)
+        if tracked and not {'code', 'base_field', 'fixed_or_calc'}.isdisjoint(vals):
+            # population de l'ancienne définition
+            self._mark_payroll_population()
+        res = super().write(vals)
+        if tracked:
+            self.env.registry.clear_cache()
+            self._mark_payroll_population()
+        return res
+
+    def unlink(self):
+        self._mark_payroll_population()
+        res = super().unlink()
+        self.env.registry.clear_cache()
+        return res
+
+    @api.model
+    @tools.ormcache()
+    def _get_rule_index(self):
+        """Index compilé des rubriques, mis en cache jusqu'à leur prochaine
+        modification.
+
+        Retourne ``(rubriques, rubrique_ids, codes, columns)`` : les
+        paramètres de calcul (``RUBRIQUE_FIELDS``) de chaque rubrique triés
+        par id, leurs ids, les codes triés et, pour chacun, la colonne de la
+        rubrique correspondante. Les codes s'y résolvent par recherche
+        dichotomique sur tout un vecteur (voir ``resolve_rule_columns``).
+        """
+        rubriques = tuple(
+            tools.frozendict(rub)
+            for rub in self.sudo().search_read([], RUBRIQUE_FIELDS, order='id'))
+        rub_ids = np.asarray([rub['id'] for rub in rubriques], dtype=np.int64)
+        codes = np.asarray([rub['code'] for rub in rubriques], dtype=str)
+        order = np.argsort(codes)
+        codes, columns = codes[order], order.astype(np.int64)
+        for array in (rub_ids, codes, columns):
+            array.flags.writeable = False
+        return rubriques, rub_ids, codes, columns
+
+    @api.model
+    def resolve_rule_columns(self, rule_codes):
+        """Colonnes (position dans l'index) des rubriques de ``rule_codes``.
+
+        Retourne ``(columns, known)`` alignés sur ``rule_codes`` ; ``known``
+        est faux pour un code sans rubrique (colonne alors sans objet).
+        """
+        _rubriques, _rub_ids, codes, columns = self._get_rule_index()
+        rule_codes = np.asarray(rule_codes, dtype=str)
+        if not len(codes):
+            return np.zeros(len(rule_codes), dtype=np.int64), np.zeros(len(rule_codes), dtype=bool)
+        pos = np.minimum(np.searchsorted(codes, rule_codes), len(codes) - 1)
+        return columns[pos], codes[pos] == rule_codes
+
+    def _mark_payroll_population(self):
+        """Marque à recalculer les salariés dont la paie dépend de ces
+        rubriques : tous pour une rubrique calculée sur le salaire, sinon ceux
+        qui ont un pointage ou un appointement journalier sur la rubrique."""
+        if not self:
+            return
+        Change = self.env['softy_pay.payroll.change']
+        if any(rub.fixed_or_calc != 'fixed' and rub.base_field == 'salary' for rub in self):
+            Change.mark_query("SELECT id FROM hr_employee")
+            return
+        Change.mark_query("""
+            SELECT employee_id FROM softy_pay_pointage_line
+             WHERE rubrique_id = ANY(%(rubriques)s)
+            UNION
+            SELECT employee_id FROM softy_pay_daily_allowance
+             WHERE rule_code = ANY(%(codes)s)
+        """, {'rubriques': self.ids, 'codes': self.mapped('code')})
+
 
 class SoftyPayRubriquePatronale(models.Model):
     _name = 'softy_pay.rubrique.patronale'
@@ -70,6 +188,105 @@ class SoftyPayRubriquePatronale(models.Model):
         ('pat_code_unique', 'unique(code)', "Le code patronal doit être unique."),
     ]
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        res = super().create(vals_list)
+        res._mark_payroll_population()
+        return res
+
+    def write(self, vals):
+        if 'employee_cats' in vals:
+            self._mark_payroll_population()
+        res = super().write(vals)
+        if not {'rate', 'base_field', 'employee_cats'}.isdisjoint(vals):
+            self._mark_payroll_population()
+        return res
+
+    def unlink(self):
+        self._mark_payroll_population()
+        return super().unlink()
+
+    def _mark_payroll_population(self):
+        """Marque à recalculer les salariés soumis à ces rubriques : tous si
+        l'une d'elles n'a pas de catégorie, sinon les salariés des catégories."""
+        if not self:
+            return
+        Change = self.env['softy_pay.payroll.change']
+        if any(not rub.employee_cats for rub in self):
+            Change.mark_query("SELECT id FROM hr_employee")
+            return
+        Change.mark_query("""
+            SELECT employee_id FROM employee_category_rel
+             WHERE category_id = ANY(%(categories)s)
+        """, {'categories': self.employee_cats.ids})
+
+    @api.model
+    def _get_applicability_bitmap(self, employee_ids):
+        """Table salarié → rubriques patronales applicables de ``employee_ids``,
+        construite à chaque calcul (trois requêtes) plutôt que mise en cache :
+        les affectations de catégories changent au fil des saisies RH.
+
+        Retourne ``(employee_ids, rubrique_ids, universal, bits)`` où ``bits``
+        est la matrice booléenne salarié × rubrique compactée par
+        ``numpy.packbits`` et ``universal`` le masque des rubriques sans
+        catégorie.
+        Une rubrique sans catégorie s'applique à tous les salariés. Les
+        salariés absents de la table n'ont que ces rubriques universelles.
+        """
+        cr = self.env.cr
+        self.env.flush_all()
+        cr.execute("SELECT id FROM softy_pay_rubrique_patronale ORDER BY id")
+        rub_ids = np.asarray([row[0] for row in cr.fetchall()], dtype=np.int64)
+        cr.execute("SELECT rub_id, cat_id FROM emp_cat_rub_pat_rel")
+        rub_cats = cr.fetchall()
+        cr.execute("""
+            SELECT employee_id, category_id
+              FROM employee_category_rel
+             WHERE employee_id = ANY(%s)
+               AND category_id IN (SELECT cat_id FROM emp_cat_rub_pat_rel)
+        """, [[int(emp_id) for emp_id in employee_ids]])
+        emp_cats = cr.fetchall()
+
+        cat_ids = np.unique(np.asarray([cat for _rub, cat in rub_cats], dtype=np.int64))
+        cat_bits = np.zeros((len(cat_ids), len(rub_ids)), dtype=bool)
+        if rub_cats:
+            rubs, cats = zip(*rub_cats)
+            cat_bits[np.searchsorted(cat_ids, cats), np.searchsorted(rub_ids, rubs)] = True
+        universal = ~cat_bits.any(axis=0)
+
+        emp_ids = np.unique(np.asarray([emp for emp, _cat in emp_cats], dtype=np.int64))
+        matrix = np.zeros((len(emp_ids), len(rub_ids)), dtype=bool)
+        matrix[:, universal] = True
+        if emp_cats:
+            emps, cats = zip(*emp_cats)
+            np.logical_or.at(matrix, np.searchsorted(emp_ids, emps),
+                             cat_bits[np.searchsorted(cat_ids, cats)])
+        return emp_ids, rub_ids, universal, np.packbits(matrix, axis=1)
+
+    @api.model
+    def compute_contributions(self, employee_ids, salary, brut_impo):
+        """Charges patronales de toute la population en une étape vectorisée.
+
+        ``employee_ids`` (trié), ``salary`` et ``brut_impo`` sont des
+        tableaux alignés. Retourne ``(rubriques, montants)`` : la liste des
+        rubriques (``id``, ``code``) et la matrice salarié × rubrique.
+        """
+        emp_ids, rub_ids, universal, bits = self._get_applicability_bitmap(employee_ids)
+        employee_ids = np.asarray(employee_ids, dtype=np.int64)
+        rubriques = self.browse(rub_ids.tolist()).read(['code', 'rate', 'base_field'])
+        applies = np.tile(universal, (len(employee_ids), 1))
+        if len(emp_ids):
+            pos = np.minimum(np.searchsorted(emp_ids, employee_ids), len(emp_ids) - 1)
+            known = emp_ids[pos] == employee_ids
+            unpacked = np.unpackbits(bits, axis=1, count=len(rub_ids)).astype(bool)
+            applies[known] = unpacked[pos[known]]
+
+        rates = np.asarray([rub['rate'] / 100.0 for rub in rubriques])
+        on_brut = np.asarray([rub['base_field'] == 'brut_impo' for rub in rubriques], dtype=bool)
+        bases = np.where(on_brut[None, :], brut_impo[:, None], salary[:, None])
+        digits = self.env['decimal.precision'].precision_get('Payroll')
+        return rubriques, np.round(applies * bases * rates[None, :], digits)
+
 
 class SoftyPayBareme(models.Model):
     _name = 'softy_pay.bareme'
@@ -84,6 +301,87 @@ class SoftyPayBareme(models.Model):
         ('bareme_code_unique', 'unique(code)', "Le code barème doit être unique."),
     ]
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        baremes = super().create(vals_list)
+        baremes._mark_payroll_population()
+        return baremes
+
+    def write(self, vals):
+        if 'code' in vals:
+            self._mark_payroll_population()
+        res = super().write(vals)
+        if 'code' in vals:
+            self._mark_payroll_population()
+        return res
+
+    def unlink(self):
+        self._mark_payroll_population()
+        return super().unlink()
+
+    def _mark_payroll_population(self):
+        """Marque à recalculer la population des rubriques qui utilisent ces
+        barèmes (``tax_code``)."""
+        codes = [code for code in self.mapped('code') if code]
+        if codes:
+            self.env['softy_pay.rubrique.salariale'].search(
+                [('tax_code', 'in', codes)])._mark_payroll_population()
+
+    @api.model
+    @tools.ormcache('bareme_id', 'effective_date')
+    def _get_bracket_index(self, bareme_id, effective_date):
+        """Index compilé des tranches d'un barème en vigueur à une date.
+
+        Retourne ``(mins, maxs, rates)`` : tableaux numpy en lecture seule,
+        triés par plancher. Lève une ``ValidationError`` si des tranches se
+        chevauchent ou laissent un trou, plutôt que de laisser la mauvaise
+        donnée se révéler plus tard au calcul.
+        """
+        self.env['softy_pay.bareme.line'].flush_model()
+        self.env.cr.execute("""
+            SELECT min_value, max_value, rate
+              FROM softy_pay_bareme_line
+             WHERE bareme_id = %s
+               AND date_start <= %s
+               AND (date_end IS NULL OR date_end >= %s)
+          ORDER BY min_value, max_value
+        """, [bareme_id, effective_date, effective_date])
+        rows = self.env.cr.fetchall()
+        if not rows:
+            raise ValidationError(
+                _("Aucune tranche en vigueur au %(date)s pour le barème %(bareme)s.",
+                  date=effective_date, bareme=self.browse(bareme_id).display_name)
+            )
+        mins, maxs, rates = (np.asarray(col, dtype=float) for col in zip(*rows))
+        errors = []
+        for i in range(1, len(mins)):
+            if mins[i] < maxs[i - 1]:
+                errors.append(_("chevauchement entre %(a)s et %(b)s",
+                                a=maxs[i - 1], b=mins[i]))
+            elif mins[i] - maxs[i - 1] > BRACKET_STEP:
+                errors.append(_("trou entre %(a)s et %(b)s",
+                                a=maxs[i - 1], b=mins[i]))
+        if errors:
+            raise ValidationError(
+                _("Barème %(bareme)s incohérent au %(date)s : %(errors)s",
+                  bareme=self.browse(bareme_id).display_name,
+                  date=effective_date, errors=", ".join(errors))
+            )
+        for col in (mins, maxs, rates):
+            col.flags.writeable = False
+        return mins, maxs, rates
+
+    @api.model
+    def resolve_rates(self, bareme_id, effective_date, bases):
+        """Taux applicables à un vecteur de bases, par recherche dichotomique.
+
+        Une base sous le premier plancher a un taux nul ; au-delà du dernier
+        plafond, la dernière tranche s'applique.
+        """
+        mins, _maxs, rates = self._get_bracket_index(bareme_id, effective_date)
+        idx = np.searchsorted(mins, np.asarray(bases, dtype=float), side='right') - 1
+        return np.where(idx >= 0, rates[np.maximum(idx, 0)], 0.0)
+
 
 class SoftyPayBaremeLine(models.Model):
     _name = 'softy_pay.bareme.line'
@@ -106,6 +404,27 @@ class SoftyPayBaremeLine(models.Model):
             if rec.rate < 0:
                 raise ValidationError(_("Taux négatif non autorisé"))
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        res = super().create(vals_list)
+        self.env.registry.clear_cache()
+        res.bareme_id._mark_payroll_population()
+        return res
+
+    def write(self, vals):
+        if 'bareme_id' in vals:
+            self.bareme_id._mark_payroll_population()
+        res = super().write(vals)
+        self.env.registry.clear_cache()
+        self.bareme_id._mark_payroll_population()
+        return res
+
+    def unlink(self):
+        self.bareme_id._mark_payroll_population()
+        res = super().unlink()
+        self.env.registry.clear_cache()
+        return res
+
 
 class SoftyPayIntegrationTemplate(models.Model):
     _name = 'softy_pay.integration.template'
@@ -120,6 +439,135 @@ class SoftyPayIntegrationTemplate(models.Model):
         ('int_name_unique', 'unique(name)', "Le nom du modèle doit être unique."),
     ]
 
+    @api.constrains('col_matricule', 'col_start', 'row_start')
+    def _check_positions(self):
+        for rec in self:
+            if rec.col_matricule < 1 or rec.col_start < 1 or rec.row_start < 2:
+                raise ValidationError(
+                    _("Colonnes numérotées à partir de 1 ; la ligne de début "
+                      "doit laisser une ligne d'en-tête (≥ 2).")
+                )
+
+    def import_pointage(self, file, date_from, date_to, batch_size=1000):
+        """Intègre un classeur Excel de pointage pour la période donnée.
+
+        ``file`` est le contenu (``bytes``) ou un objet fichier ``.xlsx``, lu en mode
+        streaming (lecture seule) à partir de ``row_start``. La ligne
+        ``row_start - 1`` porte les codes rubriques à partir de ``col_start``.
+        Les lignes de pointage sont écrites par lots (mise à jour si elles
+        existent déjà) ; une ligne invalide est rejetée sans interrompre
+        l'import.
+
+        Retourne ``{'imported': <nb lignes Excel>, 'rejected': [{'row', 'matricule', 'reason'}]}``.
+        """
+        self.ensure_one()
+        if load_workbook is None:
+            raise UserError(_("L'import Excel nécessite la librairie openpyxl."))
+        if date_to < date_from:
+            raise UserError(_("La fin de période doit être postérieure au début."))
+        if isinstance(file, str):
+            # un chemin reçu par RPC ouvrirait un fichier du serveur
+            raise UserError(_("Le classeur doit être transmis par son contenu, pas par un chemin."))
+        if isinstance(file, bytes):
+            file = io.BytesIO(file)
+        # les lignes sont écrites en SQL direct (_write_pointage_lines)
+        PointageLine = self.env['softy_pay.pointage.line']
+        PointageLine.check_access_rights('create')
+        PointageLine.check_access_rights('write')
+
+        workbook = load_workbook(file, read_only=True, data_only=True)
+        try:
+            sheet = workbook.worksheets[0]
+            header = next(sheet.iter_rows(
+                min_row=self.row_start - 1, max_row=self.row_start - 1,
+                values_only=True), ())
+            rejected = []
+            columns = self._resolve_rubrique_columns(header, rejected)
+            employees = {
+                emp['matricule']: emp['id']
+                for emp in self.env['hr.employee'].search_read(
+                    [('matricule', '!=', False)], ['matricule'])
+            }
+
+            seen = set()
+            pending = []
+            imported = 0
+            mat_idx = self.col_matricule - 1
+            for row_no, row in enumerate(
+                    sheet.iter_rows(min_row=self.row_start, values_only=True),
+                    start=self.row_start):
+                matricule = _cell_text(row[mat_idx] if mat_idx < len(row) else None)
+                if not matricule:
+                    if any(cell not in (None, '') for cell in row):
+                        rejected.append({'row': row_no, 'matricule': False,
+                                         'reason': _("Matricule manquant")})
+                    continue
+                employee_id = employees.get(matricule)
+                if not employee_id:
+                    rejected.append({'row': row_no, 'matricule': matricule,
+                                     'reason': _("Matricule inconnu")})
+                    continue
+                if employee_id in seen:
+                    rejected.append({'row': row_no, 'matricule': matricule,
+                                     'reason': _("Matricule en double dans le fichier")})
+                    continue
+                try:
+                    lines = [
+                        (employee_id, rubrique_id, date_from, date_to, float(row[idx]))
+                        for idx, rubrique_id in columns
+                        if idx < len(row) and row[idx] not in (None, '')
+                    ]
+                except (TypeError, ValueError):
+                    rejected.append({'row': row_no, 'matricule': matricule,
+                                     'reason': _("Valeur non numérique")})
+                    continue
+                seen.add(employee_id)
+                pending.extend(lines)
+                imported += 1
+                if len(pending) >= batch_size:
+                    self._write_pointage_lines(pending)
+                    pending = []
+            self._write_pointage_lines(pending)
+        finally:
+            workbook.close()
+        self.env['softy_pay.pointage.line'].invalidate_model()
+        return {'imported': imported, 'rejected': rejected}
+
+    def _resolve_rubrique_columns(self, header, rejected):
+        """Associe les colonnes d'en-tête aux rubriques en une seule recherche."""
+        codes = {}
+        for idx in range(self.col_start - 1, len(header)):
+            code = _cell_text(header[idx])
+            if code and code not in codes:
+                codes[code] = idx
+        rubriques = {
+            r['code']: r['id']
+            for r in self.env['softy_pay.rubrique.salariale'].search_read(
+                [('code', 'in', list(codes))], ['code'])
+        }
+        for code in codes.keys() - rubriques.keys():
+            rejected.append({'row': self.row_start - 1, 'matricule': False,
+                             'reason': _("Rubrique inconnue : %s", code)})
+        return [(idx, rubriques[code]) for code, idx in codes.items() if code in rubriques]
+
+    def _write_pointage_lines(self, rows):
+        if not rows:
+            return
+        self.env['softy_pay.payroll.change'].mark(row[0] for row in rows)
+        self.env['softy_pay.pointage.grid.change'].log_pointage(
+            (row[0], row[1]) for row in rows)
+        bulk_insert(
+            self.env, 'softy_pay_pointage_line',
+            ['employee_id', 'rubrique_id', 'date_from', 'date_to', 'value'],
+            rows,
+            on_conflict="""
+                ON CONFLICT (employee_id, rubrique_id, date_from) DO UPDATE
+                SET value = EXCLUDED.value,
+                    date_to = EXCLUDED.date_to,
+                    write_uid = EXCLUDED.write_uid,
+                    write_date = EXCLUDED.write_date
+            """)
+
 
 class SoftyPayPointageGrid(models.Model):
     _name = 'softy_pay.pointage.grid'
@@ -137,6 +585,315 @@ class SoftyPayPointageGrid(models.Model):
          "Chaque champ ne peut figurer qu’une fois par grille."),
     ]
 
+    @api.constrains('field_name')
+    def _check_field_name(self):
+        Employee = self.env['hr.employee']
+        codes = set(self.env['softy_pay.rubrique.salariale'].search(
+            [('code', 'in', self.mapped('field_name'))]).mapped('code'))
+        for rec in self:
+            if rec.field_name not in Employee._fields and rec.field_name not in codes:
+                raise ValidationError(
+                    _("« %s » n'est ni un champ salarié ni un code rubrique.", rec.field_name)
+                )
+
+    @api.model
+    def _get_grid_columns(self, grid_name):
+        """Colonnes visibles de la grille : champ salarié, ou rubrique
+        désignée par son code (valeur de pointage de la période)."""
+        lines = self.search([('name', '=', grid_name), ('visible', '=', True)], order='id')
+        if not lines:
+            raise UserError(_("Grille de pointage inconnue : %s", grid_name))
+        Employee = self.env['hr.employee']
+        rubriques = {
+            r['code']: r['id']
+            for r in self.env['softy_pay.rubrique.salariale'].search_read(
+                [('code', 'in', lines.mapped('field_name'))], ['code'])
+        }
+        columns = []
+        for line in lines:
+            field = Employee._fields.get(line.field_name)
+            if field is None and line.field_name not in rubriques:
+                continue
+            columns.append({
+                'field_name': line.field_name,
+                'label': line.label,
+                'modifiable': line.modifiable and (
+                    field is None or (field.store and not field.compute
+                                      and field.name not in models.MAGIC_COLUMNS)),
+                'rubrique_id': rubriques[line.field_name] if field is None else False,
+            })
+        return columns
+
+    @api.model
+    def grid_read(self, grid_name, date_from, date_to, domain=None,
+                  offset=0, limit=GRID_PAGE_SIZE):
+        """Page de la grille ``grid_name`` sous forme de colonnes.
+
+        Une recherche paginée des salariés (``domain``, triés par matricule),
+        une lecture des champs salarié et une requête sur les lignes de
+        pointage de la période, quel que soit le nombre de colonnes.
+        Retourne ``{'columns', 'ids', 'values', 'total', 'version'}`` où
+        ``values[field_name]`` est aligné sur ``ids`` ; ``version`` (jeton
+        opaque) sert ensuite à ``grid_changes``.
+        """
+        columns = self._get_grid_columns(grid_name)
+        domain = domain or []
+        version = self.env['softy_pay.pointage.grid.change'].current_version()
+        Employee = self.env['hr.employee']
+        employees = Employee.search(domain, offset=offset, limit=limit, order='matricule, id')
+        result = self._read_cells(columns, employees, date_from, date_to)
+        result.update(columns=columns, total=Employee.search_count(domain), version=version)
+        return result
+
+    @api.model
+    def grid_changes(self, grid_name, date_from, date_to, since_version, domain=None):
+        """Cellules des colonnes visibles modifiées depuis ``since_version``.
+
+        Seuls les salariés concernés (et dans ``domain``) sont relus ; même
+        format que ``grid_read``, sans pagination ni total.
+        """
+        columns = self._get_grid_columns(grid_name)
+        Change = self.env['softy_pay.pointage.grid.change']
+        version = Change.current_version()
+        emp_ids = Change.changed_since(since_version, [c['field_name'] for c in columns])
+        Employee = self.env['hr.employee']
+        employees = Employee.search(
+            (domain or []) + [('id', 'in', emp_ids)], order='matricule, id'
+        ) if emp_ids else Employee
+        result = self._read_cells(columns, employees, date_from, date_to)
+        result.update(columns=columns, version=version)
+        return result
+
+    @api.model
+    def grid_apply(self, grid_name, date_from, date_to, deltas):
+        """Applique un lot de modifications ``[{'id', 'field_name', 'value'}]``.
+
+        Les colonnes invisibles ou non modifiables sont refusées. Les champs
+        salarié sont écrits en une fois par groupe de salariés recevant les
+        mêmes valeurs, sous point de sauvegarde : une erreur est rapportée
+        sans annuler le reste du lot. Les valeurs de rubrique sont insérées
+        ou mises à jour en une requête ; ``None`` supprime la ligne. Ces
+        écritures SQL sont soumises aux droits et règles d'accès des lignes
+        de pointage.
+        Retourne ``{'applied', 'rejected': [{'id', 'field_name', 'reason'}], 'version'}``.
+        """
+        columns = {c['field_name']: c for c in self._get_grid_columns(grid_name)}
+        Employee = self.env['hr.employee']
+        known = set(Employee.browse(
+            {d.get('id') for d in deltas if isinstance(d.get('id'), int)}).exists().ids)
+        rejected = []
+        employee_vals = defaultdict(dict)
+        pointage = {}
+        for delta in deltas:
+            emp_id, field_name, value = delta.get('id'), delta.get('field_name'), delta.get('value')
+            column = columns.get(field_name)
+            reason = None
+            if emp_id not in known:
+                reason = _("Salarié inconnu")
+            elif not column:
+                reason = _("Colonne absente de la grille")
+            elif not column['modifiable']:
+                reason = _("Colonne non modifiable")
+            elif column['rubrique_id'] and value not in (None, ''):
+                try:
+                    value = float(value)
+                except (TypeError, ValueError):
+                    reason = _("Valeur non numérique")
+            if reason:
+                rejected.append({'id': emp_id, 'field_name': field_name, 'reason': reason})
+            elif column['rubrique_id']:
+                pointage[emp_id, column['rubrique_id']] = None if value == '' else value
+            else:
+                employee_vals[emp_id][field_name] = value
+
+        groups = {}
+        for emp_id, vals in employee_vals.items():
+            key = tuple(sorted((name, repr(value)) for name, value in vals.items()))
+            groups.setdefault(key, (vals, []))[1].append(emp_id)
+        written = [key for key, value in pointage.items() if value is not None]
+        deleted = [key for key, value in pointage.items() if value is None]
+        self._check_pointage_access(written, deleted, date_from)
+        applied = len(pointage)
+        for vals, emp_ids in groups.values():
+            try:
+                with self.env.cr.savepoint():
+                    Employee.browse(emp_ids).write(vals)
+            except (UserError, ValidationError, ValueError) as e:
+                rejected.extend({'id': emp_id, 'field_name': name, 'reason': str(e)}
+                                for emp_id in emp_ids for name in vals)
+                continue
+            applied += len(emp_ids) * len(vals)
+
+        self.env['softy_pay.integration.template']._write_pointage_lines([
+            (emp_id, rub_id, date_from, date_to, pointage[emp_id, rub_id])
+            for emp_id, rub_id in written
+        ])
+        self._delete_pointage_lines(deleted, date_from)
+        return {'applied': applied, 'rejected': rejected,
+                'version': self.env['softy_pay.pointage.grid.change'].current_version()}
+
+    @api.model
+    def _check_pointage_access(self, written, deleted, date_from):
+        """Droits et règles d'accès des lignes de pointage écrites
+        (``written``) ou supprimées (``deleted``) en SQL direct."""
+        PointageLine = self.env['softy_pay.pointage.line']
+        if written:
+            PointageLine.check_access_rights('create')
+            PointageLine.check_access_rights('write')
+        if deleted:
+            PointageLine.check_access_rights('unlink')
+        cells = set(written) | set(deleted)
+        if not cells:
+            return
+        existing = PointageLine.sudo().search([
+            ('employee_id', 'in', list({emp_id for emp_id, _rub_id in cells})),
+            ('rubrique_id', 'in', list({rub_id for _emp_id, rub_id in cells})),
+            ('date_from', '=', date_from),
+        ]).filtered(lambda line: (line.employee_id.id, line.rubrique_id.id) in cells)
+        existing = existing.with_env(self.env)
+        deleted = set(deleted)
+        existing.filtered(
+            lambda line: (line.employee_id.id, line.rubrique_id.id) not in deleted
+        ).check_access_rule('write')
+        existing.filtered(
+            lambda line: (line.employee_id.id, line.rubrique_id.id) in deleted
+        ).check_access_rule('unlink')
+
+    @api.model
+    def _read_cells(self, columns, employees, date_from, date_to):
+        ids = employees.ids
+        values = {}
+        emp_fields = [c['field_name'] for c in columns if not c['rubrique_id']]
+        records = employees.read(emp_fields) if emp_fields and ids else []
+        for name in emp_fields:
+            values[name] = [rec[name] for rec in records]
+        rub_columns = {c['rubrique_id']: c['field_name'] for c in columns if c['rubrique_id']}
+        for name in rub_columns.values():
+            values[name] = [None] * len(ids)
+        if rub_columns and ids:
+            self.env['softy_pay.pointage.line'].flush_model()
+            self.env.cr.execute("""
+                SELECT employee_id, rubrique_id, SUM(value)
+                  FROM softy_pay_pointage_line
+                 WHERE employee_id = ANY(%s)
+                   AND rubrique_id = ANY(%s)
+                   AND date_from >= %s
+                   AND date_to <= %s
+              GROUP BY employee_id, rubrique_id
+            """, [ids, list(rub_columns), date_from, date_to])
+            position = {emp_id: i for i, emp_id in enumerate(ids)}
+            for emp_id, rub_id, value in self.env.cr.fetchall():
+                values[rub_columns[rub_id]][position[emp_id]] = value
+        return {'ids': ids, 'values': values}
+
+    @api.model
+    def _delete_pointage_lines(self, cells, date_from):
+        if not cells:
+            return
+        emp_ids, rub_ids = zip(*cells)
+        self.env['softy_pay.payroll.change'].mark(emp_ids)
+        self.env['softy_pay.pointage.grid.change'].log_pointage(cells)
+        self.env['softy_pay.pointage.line'].flush_model()
+        self.env.cr.execute("""
+            DELETE FROM softy_pay_pointage_line l
+             USING unnest(%s::int[], %s::int[]) AS cell (employee_id, rubrique_id)
+             WHERE l.employee_id = cell.employee_id
+               AND l.rubrique_id = cell.rubrique_id
+               AND l.date_from = %s
+        """, [list(emp_ids), list(rub_ids), date_from])
+        self.env['softy_pay.pointage.line'].invalidate_model()
+
+
+class SoftyPayPointageGridChange(models.Model):
+    """Dernière modification de chaque cellule de grille.
+
+    Chaque cellule porte l'identifiant de la transaction qui l'a modifiée
+    (colonne SQL ``change_xid``, hors ORM : ``bigint``). La « version »
+    remise aux clients est l'instantané de transaction de leur lecture : les
+    cellules modifiées depuis sont celles qui n'y étaient pas visibles, y
+    compris celles d'une transaction encore en cours au moment de la
+    lecture et validée ensuite.
+    """
+    _name = 'softy_pay.pointage.grid.change'
+    _description = "Version des cellules de grille de pointage"
+    _log_access = False
+
+    employee_id = fields.Many2one(
+        'hr.employee', "Salarié", required=True, ondelete='cascade')
+    field_name  = fields.Char("Champ Pointage", required=True)
+
+    _sql_constraints = [
+        ('cell_unique', 'unique(employee_id, field_name)',
+         "Une seule version par cellule."),
+    ]
+
+    def init(self):
+        cr = self.env.cr
+        cr.execute("""
+            ALTER TABLE softy_pay_pointage_grid_change ADD COLUMN IF NOT EXISTS change_xid bigint
+        """)
+        create_index(cr, 'softy_pay_pointage_grid_change_xid_idx', self._table, ['change_xid'])
+
+    @api.model
+    def current_version(self):
+        return self.env['softy_pay.payroll.change'].current_snapshot()
+
+    @api.model
+    def changed_since(self, version, field_names):
+        """Ids des salariés dont une cellule de ``field_names`` n'était pas
+        visible dans l'instantané ``version`` (toutes si ``version`` est
+        vide)."""
+        self.flush_model()
+        self.env.cr.execute("""
+            SELECT DISTINCT employee_id FROM softy_pay_pointage_grid_change
+             WHERE field_name = ANY(%(names)s)
+               AND (%(version)s IS NULL OR (
+                    change_xid >= txid_snapshot_xmin(%(version)s::txid_snapshot)
+                    AND NOT txid_visible_in_snapshot(change_xid, %(version)s::txid_snapshot)))
+        """, {'version': version or None, 'names': list(field_names)})
+        return [row[0] for row in self.env.cr.fetchall()]
+
+    @api.model
+    def log(self, cells):
+        """Marque modifiées les cellules ``(employee_id, field_name)``."""
+        cells = set(cells)
+        if not cells:
+            return
+        emp_ids, field_names = zip(*cells)
+        self._upsert("SELECT * FROM unnest(%(emps)s::int[], %(names)s::varchar[])",
+                     {'emps': list(emp_ids), 'names': list(field_names)})
+
+    @api.model
+    def log_pointage(self, cells):
+        """Comme ``log``, pour des cellules ``(employee_id, rubrique_id)``."""
+        cells = set(cells)
+        if not cells:
+            return
+        emp_ids, rub_ids = zip(*cells)
+        self._upsert("""
+            SELECT cell.employee_id, r.code
+              FROM unnest(%(emps)s::int[], %(rubs)s::int[]) AS cell (employee_id, rubrique_id)
+              JOIN softy_pay_rubrique_salariale r ON r.id = cell.rubrique_id
+        """, {'emps': list(emp_ids), 'rubs': list(rub_ids)})
+
+    @api.model
+    def log_employee_fields(self, employee_ids, field_names):
+        """Comme ``log``, pour les champs salarié présents dans une grille."""
+        if not employee_ids or not field_names:
+            return
+        names = set(self.env['softy_pay.pointage.grid'].sudo().search(
+            [('field_name', 'in', list(field_names))]).mapped('field_name'))
+        self.log((emp_id, name) for emp_id in employee_ids for name in names)
+
+    def _upsert(self, query, params):
+        self.env.cr.execute("""
+            INSERT INTO softy_pay_pointage_grid_change (employee_id, field_name, change_xid)
+            SELECT cell.employee_id, cell.field_name, txid_current()
+              FROM ({query}) AS cell (employee_id, field_name)
+            ON CONFLICT (employee_id, field_name) DO UPDATE SET change_xid = EXCLUDED.change_xid
+        """.format(query=query), params)
+        self.invalidate_model()
+
 
 class SoftyPayTeamLeader(models.Model):
     _name = 'softy_pay.team.leader'
@@ -168,3 +925,97 @@ class SoftyPayCompanyBank(models.Model):
          'unique(iban)',
          "Chaque IBAN doit être unique sur le système."),
     ]
+
+    def generate_transfer_files(self, run, split_by='bank', record_limit=0, directory=None):
+        """Génère les fichiers de virement des salaires d'une campagne.
+
+        Les nets à payer des salariés payés par virement sont lus par un
+        curseur serveur et écrits enregistrement par enregistrement ; les
+        totaux de contrôle sont cumulés au fil de l'eau. Un nouveau fichier
+        est ouvert à chaque changement de banque du salarié
+        (``split_by='bank'``) ou tous les ``record_limit`` enregistrements.
+        Les fichiers sont écrits dans ``directory`` s'il est fourni, sinon
+        joints à la campagne.
+
+        Retourne ``{'files': [...], 'blocked': [...], 'rejected': [...]}`` ;
+        les salariés en paie bloquée sont écartés et listés dans ``blocked``.
+        """
+        self.ensure_one()
+        if run.company_id != self.company_id:
+            raise UserError(_("La banque débitrice doit appartenir à la société de la campagne."))
+        self.env['softy_pay.payroll.run.line'].flush_model()
+        self.env['hr.employee'].flush_model()
+        self.env['res.partner.bank'].flush_model()
+        order = "COALESCE(bank.bic, bank.name, ''), e.matricule" \
+            if split_by == 'bank' else "e.matricule"
+        query = """
+            SELECT e.id, e.matricule, e.name, e.pay_blocked,
+                   acc.acc_number, bank.bic, bank.name,
+                   SUM(CASE l.line_type WHEN 'gain' THEN l.amount
+                                        WHEN 'retenue' THEN -l.amount
+                                        ELSE 0 END)
+              FROM softy_pay_payroll_run_line l
+              JOIN hr_employee e ON e.id = l.employee_id
+         LEFT JOIN res_partner_bank acc ON acc.id = e.bank_account_id
+         LEFT JOIN res_bank bank ON bank.id = acc.bank_id
+             WHERE l.run_id = %s
+               AND e.payment_mode = 'bank_transfer'
+          GROUP BY e.id, acc.id, bank.id
+          ORDER BY {order}
+        """.format(order=order)
+
+        files, blocked, rejected = [], [], []
+        current = None
+        with self.env.cr._cnx.cursor('softy_pay_bank_transfer') as server_cursor:
+            server_cursor.itersize = 2000
+            server_cursor.execute(query, [run.id])
+            for emp_id, matricule, name, pay_blocked, account, bic, bank_name, net in server_cursor:
+                employee = {'employee_id': emp_id, 'matricule': matricule, 'name': name}
+                if pay_blocked:
+                    blocked.append(employee)
+                    continue
+                if not account:
+                    rejected.append(dict(employee, reason=_("Compte bancaire manquant")))
+                    continue
+                if net <= 0:
+                    rejected.append(dict(employee, reason=_("Net à payer nul ou négatif")))
+                    continue
+                key = (bic or bank_name or '') if split_by == 'bank' else ''
+                if current and (current.key != key
+                                or (record_limit and current.count >= record_limit)):
+                    files.append(self._close_transfer_file(current, run, len(files), directory))
+                    current = None
+                if current is None:
+                    current = FixedWidthFile(key)
+                    current.write(self._transfer_header(run), counted=False)
+                current.write(''.join([
+                    'D',
+                    ascii_field(matricule, 12),
+                    ascii_field(name, 35),
+                    ascii_field(account.replace(' ', ''), 34),
+                    ascii_field(bic, 11),
+                    cents(net, 15),
+                ]), net)
+        if current:
+            files.append(self._close_transfer_file(current, run, len(files), directory))
+        return {'files': files, 'blocked': blocked, 'rejected': rejected}
+
+    def _transfer_header(self, run):
+        return ''.join([
+            'H',
+            ascii_field(self.iban.replace(' ', ''), 34),
+            ascii_field(self.bic, 11),
+            run.date_to.strftime('%Y%m%d'),
+            ascii_field(run.name, 30),
+        ])
+
+    def _close_transfer_file(self, transfer_file, run, index, directory):
+        transfer_file.write(''.join([
+            'T', ascii_field(transfer_file.count, 8, align='right', fill='0'),
+            cents(transfer_file.total, 18),
+        ]), counted=False)
+        transfer_file.close()
+        name = 'VIR_%s_%s_%03d.txt' % (
+            run.date_to.strftime('%Y%m'), ascii_field(transfer_file.key, 11).strip() or 'ALL',
+            index + 1)
+        return deliver_file(self.env, transfer_file, name, run, directory)
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""Helpers SQL partagés par les traitements de masse (paie, imports)."""
+from psycopg2.extras import execute_values
+
+# Au-delà de ce nombre d'enregistrements, les contraintes d'organisation sont
+# vérifiées par une seule jointure SQL plutôt qu'enregistrement par enregistrement.
+SET_BASED_CHECK_THRESHOLD = 100
+
+
+def use_set_based_checks(records):
+    """Vrai si les contraintes de ``records`` doivent être vérifiées en SQL.
+
+    Le mode ensembliste peut être forcé par le contexte ``set_based_checks``.
+    """
+    return (len(records) >= SET_BASED_CHECK_THRESHOLD
+            or records.env.context.get('set_based_checks', False))
+
+
+def fetch_violations(records, query):
+    """Exécute ``query`` (paramètre unique : la liste des ids) et retourne les
+    enregistrements en infraction, après écriture du cache en base."""
+    records.env.flush_all()
+    records.env.cr.execute(query, [records.ids])
+    return records.browse(row[0] for row in records.env.cr.fetchall())
+
+
+def bulk_insert(env, table, columns, rows, page_size=1000, on_conflict=None):
+    """Insère ``rows`` dans ``table`` par requêtes multi-lignes.
+
+    Les colonnes d'audit (``create_uid``, ``write_uid``, ``create_date``,
+    ``write_date``) sont renseignées automatiquement. ``on_conflict`` est une
+    clause ``ON CONFLICT ...`` optionnelle. Retourne la liste des ids créés
+    ou mis à jour, dans l'ordre de ``rows``.
+    """
+    if not rows:
+        return []
+    uid = env.uid
+    query = """
+        INSERT INTO {table} ({columns}, create_uid, write_uid, create_date, write_date)
+        VALUES %s
+        {on_conflict}
+        RETURNING id
+    """.format(table=table, columns=', '.join(columns), on_conflict=on_conflict or '')
+    template = "({}, {uid}, {uid}, now() at time zone 'UTC', now() at time zone 'UTC')".format(
+        ', '.join(['%s'] * len(columns)), uid=int(uid))
+    ids = []
+    for start in range(0, len(rows), page_size):
+        chunk = rows[start:start + page_size]
+        ids.extend(r[0] for r in execute_values(
+            env.cr._obj, query, chunk, template=template,
+            page_size=page_size, fetch=True))
+    return ids
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""Écriture en flux des fichiers à format fixe (virements, déclarations)."""
+import csv
+import io
+import os
+import shutil
+import tempfile
+import unicodedata
+
+
+def ascii_field(value, width, align='left', fill=' '):
+    """Champ à largeur fixe, en majuscules ASCII sans accents, tronqué si besoin."""
+    text = unicodedata.normalize('NFKD', str(value or ''))
+    text = text.encode('ascii', 'ignore').decode('ascii').upper()[:width]
+    return text.rjust(width, fill) if align == 'right' else text.ljust(width, fill)
+
+
+def cents(amount, width):
+    return ascii_field('%d' % round(amount * 100), width, align='right', fill='0')
+
+
+def csv_line(values, delimiter=';'):
+    buffer = io.StringIO()
+    csv.writer(buffer, delimiter=delimiter, lineterminator='').writerow(
+        [ascii_field(value, 255).strip() if isinstance(value, str) else value
+         for value in values])
+    return buffer.getvalue()
+
+
+def deliver_file(env, streamed_file, name, record, directory=None):
+    """Déplace le fichier fermé dans ``directory`` ou le joint à ``record``.
+
+    Retourne le résumé ``{'name', 'count', 'total', 'path' | 'attachment_id'}``.
+    """
+    summary = {'name': name, 'count': streamed_file.count, 'total': streamed_file.total}
+    if directory:
+        summary['path'] = os.path.join(directory, name)
+        shutil.move(streamed_file.path, summary['path'])
+    else:
+        summary['attachment_id'] = env['ir.attachment'].create({
+            'name': name,
+            'raw': streamed_file.read_and_remove(),
+            'res_model': record._name,
+            'res_id': record.id,
+            'mimetype': 'text/csv' if name.endswith('.csv') else 'text/plain',
+        }).id
+    return summary
+
+
+class FixedWidthFile:
+    """Fichier temporaire écrit ligne à ligne, avec totaux de contrôle cumulés
+    au fil de l'eau : seul l'enregistrement en cours est en mémoire."""
+
+    def __init__(self, key):
+        self.key = key
+        self.count = 0
+        self.total = 0.0
+        fd, self.path = tempfile.mkstemp(suffix='.txt')
+        self._file = os.fdopen(fd, 'w', encoding='ascii', newline='\r\n')
+
+    def write(self, line, amount=0.0, counted=True):
+        self._file.write(line + '\n')
+        if counted:
+            self.count += 1
+            self.total += amount
+
+    def close(self):
+        self._file.close()
+
+    def read_and_remove(self):
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        os.unlink(self.path)
+        return data
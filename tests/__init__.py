@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+from . import test_query_plans
+from . import test_payroll_tracking
+from . import test_payroll_engine
+from . import test_bareme
+from . import test_employee
+from . import test_employee_related
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+from datetime import date
+
+from odoo.exceptions import ValidationError
+from odoo.tests import TransactionCase
+
+
+class TestBareme(TransactionCase):
+    """Résolution des tranches de barème et contrôle de leur cohérence."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.Bareme = cls.env['softy_pay.bareme']
+        cls.bareme = cls.Bareme.create({'code': 'BAR_IR', 'name': 'Barème IR'})
+
+    def _lines(self, *brackets, date_start=date(2025, 1, 1), date_end=None):
+        self.env['softy_pay.bareme.line'].create([{
+            'bareme_id': self.bareme.id, 'min_value': low, 'max_value': high,
+            'rate': rate, 'date_start': date_start, 'date_end': date_end,
+        } for low, high, rate in brackets])
+
+    def test_resolve_rates(self):
+        self._lines((0, 2500, 0), (2501, 4166, 10), (4167, 1e9, 20))
+        rates = self.Bareme.resolve_rates(
+            self.bareme.id, date(2025, 6, 30), [-10, 0, 2500.5, 2501, 4166, 50000])
+        self.assertEqual(rates.tolist(), [0, 0, 0, 10, 10, 20])
+
+    def test_effective_date(self):
+        self._lines((0, 1e9, 10), date_end=date(2024, 12, 31), date_start=date(2024, 1, 1))
+        self._lines((0, 1e9, 12))
+        Bareme = self.Bareme
+        self.assertEqual(Bareme.resolve_rates(self.bareme.id, date(2024, 6, 30), [100]).tolist(), [10])
+        self.assertEqual(Bareme.resolve_rates(self.bareme.id, date(2025, 6, 30), [100]).tolist(), [12])
+        with self.assertRaisesRegex(ValidationError, "Aucune tranche"):
+            Bareme.resolve_rates(self.bareme.id, date(2023, 6, 30), [100])
+
+    def test_gap_rejected(self):
+        self._lines((0, 2500, 0), (3000, 1e9, 10))
+        with self.assertRaisesRegex(ValidationError, "trou"):
+            self.Bareme._get_bracket_index(self.bareme.id, date(2025, 6, 30))
+
+    def test_overlap_rejected(self):
+        self._lines((0, 2500, 0), (2000, 1e9, 10))
+        with self.assertRaisesRegex(ValidationError, "chevauchement"):
+            self.Bareme._get_bracket_index(self.bareme.id, date(2025, 6, 30))
+
+    def test_index_refreshed_on_line_change(self):
+        self._lines((0, 1e9, 10))
+        self.assertEqual(self.Bareme.resolve_rates(self.bareme.id, date(2025, 6, 30), [100]).tolist(), [10])
+        self.bareme.line_ids.rate = 15
+        self.assertEqual(self.Bareme.resolve_rates(self.bareme.id, date(2025, 6, 30), [100]).tolist(), [15])
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import TransactionCase
+
+from ..models.employee import MATRICULE_SEQUENCE
+
+
+class TestMatricules(TransactionCase):
+    """Réservation des matricules par blocs (reserve_matricules)."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.Employee = cls.env['hr.employee']
+        cls.env['ir.sequence'].search([('code', '=', MATRICULE_SEQUENCE)]).unlink()
+
+    def _sequence(self, **vals):
+        return self.env['ir.sequence'].create(dict({
+            'name': 'Matricules (test)', 'code': MATRICULE_SEQUENCE,
+            'prefix': 'M', 'padding': 5, 'company_id': False,
+        }, **vals))
+
+    def test_without_sequence(self):
+        self.assertEqual(self.Employee.reserve_matricules(2), [False, False])
+
+    def test_standard_sequence(self):
+        self._sequence(implementation='standard')
+        first = self.Employee.reserve_matricules(3)
+        second = self.Employee.reserve_matricules(2)
+        self.assertEqual(first, ['M00001', 'M00002', 'M00003'])
+        self.assertEqual(second, ['M00004', 'M00005'])
+
+    def test_gapless_sequence(self):
+        sequence = self._sequence(implementation='no_gap', number_next=10, number_increment=2)
+        self.assertEqual(self.Employee.reserve_matricules(3), ['M00010', 'M00012', 'M00014'])
+        self.assertEqual(sequence.number_next, 16)
+        self.assertEqual(self.Employee.reserve_matricules(1), ['M00016'])
+
+    def test_create_assigns_missing_matricules(self):
+        self._sequence(implementation='no_gap')
+        vals_list = [
+            {'name': 'Premier', 'cin': 'MAT001'},
+            {'name': 'Repris', 'cin': 'MAT002', 'matricule': 'X00001'},
+            {'name': 'Second', 'cin': 'MAT003'},
+        ]
+        employees = self.Employee.create(vals_list)
+        self.assertEqual(employees.mapped('matricule'), ['M00001', 'X00001', 'M00002'])
+        # les valeurs de l'appelant restent intactes (reprise après annulation)
+        self.assertNotIn('matricule', vals_list[0])
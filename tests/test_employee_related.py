@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+from datetime import date
+
+from odoo.tests import TransactionCase
+
+
+class TestAbsenceDays(TransactionCase):
+    """Décompte des jours d'absence d'une période (get_period_absence_days)."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        Employee = cls.env['hr.employee']
+        cls.employee = Employee.create({'name': 'Absent', 'cin': 'ABS001'})
+        cls.present = Employee.create({'name': 'Présent', 'cin': 'ABS002'})
+        AbsenceType = cls.env['softy_pay.absence.type']
+        cls.maladie = AbsenceType.create({'code': 'ABS_MAL', 'name': 'Maladie (test)'})
+        cls.conge = AbsenceType.create({'code': 'ABS_CON', 'name': 'Congé (test)'})
+        Absence = cls.env['softy_pay.employee.absence']
+
+        def absence(absence_type, start, end, **vals):
+            return Absence.create(dict(
+                vals, employee_id=cls.employee.id, absence_type_id=absence_type.id,
+                date_start=start, date_end=end))
+
+        # congé commencé avant la période : seul le 1er mars compte
+        absence(cls.conge, date(2025, 2, 25), date(2025, 3, 2))
+        # deux arrêts maladie qui se chevauchent : fusionnés du 2 au 7 mars
+        cls.sick1 = absence(cls.maladie, date(2025, 3, 2), date(2025, 3, 5))
+        cls.sick2 = absence(cls.maladie, date(2025, 3, 4), date(2025, 3, 8))
+        # archivé : ignoré hors audit
+        absence(cls.maladie, date(2025, 3, 20), date(2025, 3, 22), active=False)
+        # congé débordant sur avril : les 30 et 31 mars comptent
+        absence(cls.conge, date(2025, 3, 30), date(2025, 4, 5))
+
+    def _days(self, Absence=None):
+        Absence = Absence or self.env['softy_pay.employee.absence']
+        result = Absence.get_period_absence_days(
+            [self.present.id, self.employee.id], date(2025, 3, 1), date(2025, 3, 31))
+        row = result['employee_ids'].index(self.employee.id)
+        days = {
+            type_id: int(result['days'][row, j])
+            for j, type_id in enumerate(result['type_ids'])
+        }
+        return result, days
+
+    def test_days_by_type(self):
+        result, days = self._days()
+        self.assertEqual(days, {self.maladie.id: 6, self.conge.id: 3})
+        present = result['employee_ids'].index(self.present.id)
+        self.assertFalse(result['days'][present].any())
+
+    def test_overlaps(self):
+        result, _days = self._days()
+        self.assertEqual(result['overlaps'], [(self.employee.id, self.sick1.id, self.sick2.id)])
+
+    def test_archived_read_for_audit(self):
+        Absence = self.env['softy_pay.employee.absence'].with_context(active_test=False)
+        _result, days = self._days(Absence)
+        self.assertEqual(days, {self.maladie.id: 8, self.conge.id: 3})
+
+
+class TestLoanSchedule(TransactionCase):
+    """Échéancier des prêts (_get_schedule_rows)."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.employee = cls.env['hr.employee'].create({'name': 'Emprunteur', 'cin': 'LOA001'})
+        cls.credit = cls.env['softy_pay.credit'].create({'code': 'LOA_CONSO', 'name': 'Prêt conso (test)'})
+
+    def _loan(self, **vals):
+        return self.env['softy_pay.employee.loan'].create(dict({
+            'employee_id': self.employee.id, 'credit_id': self.credit.id,
+            'file_number': 'LOA-1', 'loan_date': date(2025, 1, 10),
+        }, **vals))
+
+    def test_monthly_deduction(self):
+        loan = self._loan(amount=1000.0, monthly_deduction=300.0, first_due_date=date(2025, 1, 15))
+        self.assertEqual(loan._get_schedule_rows(), [
+            (loan.id, self.employee.id, date(2025, 1, 15), 300.0, 700.0),
+            (loan.id, self.employee.id, date(2025, 2, 15), 300.0, 400.0),
+            (loan.id, self.employee.id, date(2025, 3, 15), 300.0, 100.0),
+            (loan.id, self.employee.id, date(2025, 4, 15), 100.0, 0.0),
+        ])
+        self.assertEqual(loan.schedule_ids.mapped('amount'), [300.0, 300.0, 300.0, 100.0])
+
+    def test_spread_until_last_due_date(self):
+        loan = self._loan(amount=1000.0, first_due_date=date(2025, 1, 10),
+                          last_due_date=date(2025, 3, 10))
+        rows = loan._get_schedule_rows()
+        self.assertEqual([row[2] for row in rows],
+                         [date(2025, 1, 10), date(2025, 2, 10), date(2025, 3, 10)])
+        # la dernière échéance solde l'arrondi
+        self.assertEqual([row[3] for row in rows], [333.33, 333.33, 333.34])
+        self.assertEqual(rows[-1][4], 0.0)
+
+    def test_first_due_date_defaults_to_next_month(self):
+        loan = self._loan(amount=500.0, monthly_deduction=500.0)
+        self.assertEqual(loan._get_schedule_rows(),
+                         [(loan.id, self.employee.id, date(2025, 2, 10), 500.0, 0.0)])
+
+    def test_no_schedule_without_deduction(self):
+        loan = self._loan(amount=500.0)
+        self.assertEqual(loan._get_schedule_rows(), [])
+        self.assertFalse(loan.schedule_ids)
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+from datetime import date
+
+from odoo.tests import TransactionCase
+
+
+class TestPayrollEngine(TransactionCase):
+    """Montants du moteur vectorisé : modes fixe et calculé, appointements,
+    plafonds, barèmes, prêts et charges patronales."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.date_from, cls.date_to = date(2025, 1, 1), date(2025, 1, 31)
+        Employee = cls.env['hr.employee']
+        cls.cadre = Employee.create({'name': 'Cadre', 'cin': 'ENG001', 'salary': 10000.0})
+        cls.agent = Employee.create({'name': 'Agent', 'cin': 'ENG002', 'salary': 4000.0})
+
+        Rubrique = cls.env['softy_pay.rubrique.salariale']
+        common = {'rubrique_type': 'indemnite', 'operation': 'mul', 'coefficient': 1.0}
+        cls.base = Rubrique.create(dict(
+            common, code='ENG_BASE', name='Salaire de base', gain_or_deduction='gain'))
+        cls.prime = Rubrique.create(dict(
+            common, code='ENG_PRIME', name='Prime', gain_or_deduction='gain',
+            fixed_or_calc='fixed'))
+        cls.cnss = Rubrique.create(dict(
+            common, code='ENG_CNSS', name='CNSS', rubrique_type='cotisation',
+            gain_or_deduction='retenue', taxable=False, rate=4.48,
+            ceiling_amount=268.8, ceiling_action='interdire'))
+        cls.ir = Rubrique.create(dict(
+            common, code='ENG_IR', name='IR', rubrique_type='cotisation',
+            gain_or_deduction='retenue', taxable=False, tax_code='ENG_IR'))
+        cls.env['softy_pay.bareme'].create({
+            'code': 'ENG_IR', 'name': 'Barème IR',
+            'line_ids': [
+                (0, 0, {'min_value': 0, 'max_value': 5000, 'rate': 0,
+                        'date_start': date(2025, 1, 1)}),
+                (0, 0, {'min_value': 5001, 'max_value': 1e9, 'rate': 10,
+                        'date_start': date(2025, 1, 1)}),
+            ],
+        })
+        cls.amo = cls.env['softy_pay.rubrique.patronale'].create({
+            'code': 'ENG_AMO', 'name': 'AMO patronale', 'rate': 4.11})
+
+        cls.env['softy_pay.pointage.line'].create({
+            'employee_id': cls.cadre.id, 'rubrique_id': cls.prime.id,
+            'date_from': cls.date_from, 'date_to': cls.date_to, 'value': 500.0,
+        })
+        cls.env['softy_pay.daily.allowance'].create({
+            'employee_id': cls.agent.id, 'rule_code': 'ENG_PRIME', 'rate': 200.0})
+        credit = cls.env['softy_pay.credit'].create({'code': 'ENG_LOG', 'name': 'Prêt logement'})
+        cls.env['softy_pay.employee.loan'].create({
+            'employee_id': cls.cadre.id, 'credit_id': credit.id, 'file_number': 'ENG-1',
+            'loan_date': date(2024, 12, 1), 'amount': 1200.0, 'monthly_deduction': 400.0,
+            'first_due_date': date(2025, 1, 15),
+        })
+
+    def _compute(self):
+        result = self.env['softy_pay.payroll.engine'].compute(
+            [self.agent.id, self.cadre.id], self.date_from, self.date_to)
+        rows = {emp_id: i for i, emp_id in enumerate(result['employee_ids'].tolist())}
+        cols = {rub['code']: j for j, rub in enumerate(result['rubriques'])}
+        return result, rows, cols
+
+    def test_rubrique_amounts(self):
+        result, rows, cols = self._compute()
+        amounts = result['amounts']
+        cadre, agent = rows[self.cadre.id], rows[self.agent.id]
+        self.assertEqual(amounts[cadre, cols['ENG_BASE']], 10000.0)
+        self.assertEqual(amounts[agent, cols['ENG_BASE']], 4000.0)
+        # fixe : pointage, à défaut appointement journalier
+        self.assertEqual(amounts[cadre, cols['ENG_PRIME']], 500.0)
+        self.assertEqual(amounts[agent, cols['ENG_PRIME']], 200.0)
+        # barème résolu sur la base de chaque salarié
+        self.assertEqual(amounts[cadre, cols['ENG_IR']], 1000.0)
+        self.assertEqual(amounts[agent, cols['ENG_IR']], 0.0)
+
+    def test_ceiling(self):
+        result, rows, cols = self._compute()
+        amounts = result['amounts']
+        self.assertEqual(amounts[rows[self.cadre.id], cols['ENG_CNSS']], 268.8)
+        self.assertAlmostEqual(amounts[rows[self.agent.id], cols['ENG_CNSS']], 179.2)
+        self.assertEqual(result['warnings'], [(self.cadre.id, 'ENG_CNSS')])
+
+    def test_totals_and_loans(self):
+        result, rows, _cols = self._compute()
+        cadre = rows[self.cadre.id]
+        self.assertEqual(result['gross'][cadre], 10500.0)
+        self.assertEqual(result['brut_impo'][cadre], 10500.0)
+        # CNSS plafonnée + IR + échéance de prêt de la période
+        self.assertAlmostEqual(result['deductions'][cadre], 268.8 + 1000.0 + 400.0)
+        self.assertAlmostEqual(result['net'][cadre], 10500.0 - 1668.8)
+        self.assertEqual(result['loan_lines'], [(self.cadre.id, 'ENG_LOG', 400.0)])
+
+    def test_patronal_contributions(self):
+        result, rows, _cols = self._compute()
+        col = [rub['code'] for rub in result['patronal_rubriques']].index('ENG_AMO')
+        self.assertAlmostEqual(result['patronal'][rows[self.cadre.id], col], 411.0)
+        self.assertAlmostEqual(result['patronal'][rows[self.agent.id], col], 164.4)
+
+    def test_full_compute_drops_employees_left_the_population(self):
+        run = self.env['softy_pay.payroll.run'].create({
+            'name': 'Janvier', 'date_from': self.date_from, 'date_to': self.date_to})
+        run.action_compute()
+        self.assertIn(self.agent, run.line_ids.employee_id)
+        self.agent.active = False
+        run.action_compute()
+        self.assertNotIn(self.agent, run.line_ids.employee_id)
+        self.assertIn(self.cadre, run.line_ids.employee_id)
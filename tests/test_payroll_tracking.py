@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import TransactionCase
+
+
+class TestPayrollTracking(TransactionCase):
+    """Marques de recalcul incrémental posées par les changements de règles."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.Change = cls.env['softy_pay.payroll.change']
+        cls.category = cls.env['hr.employee.category'].create({'name': 'Cadres'})
+        cls.cadre = cls.env['hr.employee'].create({
+            'name': 'Salarié cadre', 'cin': 'TRK001',
+            'category_ids': [(6, 0, cls.category.ids)],
+        })
+        cls.other = cls.env['hr.employee'].create({'name': 'Salarié non cadre', 'cin': 'TRK002'})
+        Rubrique = cls.env['softy_pay.rubrique.patronale']
+        cls.universal = Rubrique.create({'code': 'TRK_AMO', 'name': 'AMO patronale', 'rate': 4.11})
+        cls.cadres_only = Rubrique.create({
+            'code': 'TRK_CIMR', 'name': 'CIMR cadres', 'rate': 6.0,
+            'employee_cats': [(6, 0, cls.category.ids)],
+        })
+
+    def _marked_after(self, action):
+        """Salariés du test marqués par ``action``, marques antérieures effacées."""
+        self.env.flush_all()
+        self.env.cr.execute("DELETE FROM softy_pay_payroll_change")
+        self.Change.invalidate_model()
+        action()
+        self.env.flush_all()
+        self.env.cr.execute(
+            "SELECT employee_id FROM softy_pay_payroll_change WHERE employee_id = ANY(%s)",
+            [[self.cadre.id, self.other.id]])
+        return {row[0] for row in self.env.cr.fetchall()}
+
+    def test_universal_rubrique_marks_everyone(self):
+        marked = self._marked_after(lambda: self.universal.write({'rate': 4.52}))
+        self.assertEqual(marked, {self.cadre.id, self.other.id})
+
+    def test_universal_rubrique_among_others_marks_everyone(self):
+        rubriques = self.universal | self.cadres_only
+        marked = self._marked_after(lambda: rubriques.write({'rate': 5.0}))
+        self.assertEqual(marked, {self.cadre.id, self.other.id})
+
+    def test_category_rubrique_marks_its_population(self):
+        marked = self._marked_after(lambda: self.cadres_only.write({'rate': 6.5}))
+        self.assertEqual(marked, {self.cadre.id})
+
+    def test_get_changed(self):
+        self.Change.mark([self.other.id])
+        self.env.cr.execute("SELECT txid_current()")
+        xid = self.env.cr.fetchone()[0]
+        # marque postérieure à l'instantané
+        self.assertIn(self.other.id, self.Change.get_changed('%d:%d:' % (xid, xid)))
+        # transaction en cours lors de l'instantané, validée depuis
+        self.assertIn(self.other.id, self.Change.get_changed('%d:%d:%d' % (xid, xid + 1, xid)))
+        # marque déjà visible dans l'instantané
+        self.assertNotIn(self.other.id, self.Change.get_changed('%d:%d:' % (xid + 1, xid + 1)))
@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import TransactionCase, tagged
+
+from ..benchmarks import query_plans
+
+
+@tagged('-standard', 'query_plans')
+class TestQueryPlans(TransactionCase):
+    """Plans d'exécution des requêtes critiques sur un jeu de données
+    volumineux : long, donc exclu de la suite standard."""
+
+    def test_no_sequential_scan(self):
+        # check_query_plans lève AssertionError sur un parcours séquentiel ;
+        # le test annule lui-même les données générées.
+        results = query_plans.check_query_plans(self.env, rollback=False)
+        skipped = sorted(name for name, status in results.items() if status != 'ok')
+        self.assertFalse(skipped, "contrôles sans données suffisantes : %s" % ', '.join(skipped))